@@ -1,21 +1,87 @@
-import time
+import queue
 import traceback
+import functools
+import multiprocessing
 import numpy
 import serial
 from tkinter import messagebox, filedialog
 from PIL import Image, ImageDraw
 
 import tracers
+import spatial
+import vectors
+import tracecache
+import sender
+import motion
+from curves import CurveSet, bezierSplit
 
 # Config
 SERIAL_PORT = "/dev/ttyUSB0"
 SERIAL_BAUD_RATE = 115200
 SERIAL_TIMEOUT = 3
+SERIAL_CONNECT_TIMEOUT = 10 # s, boards reset when the port opens
+SERIAL_PROTOCOL = "window" # "window": Marlin ok-window, "chars": GRBL character counting
+SERIAL_OK_WINDOW = 4 # unacknowledged lines, Marlin's BUFSIZE
+SERIAL_RX_BUFFER = 127 # bytes, GRBL's receive buffer minus one
+SERIAL_LINE_NUMBERS = False # N/checksum on every line, resends on request (Marlin)
+MOTION_POLL_INTERVAL = 100 # ms
 PX_PER_MM = 8
 G0_FEEDRATE = 1200
 G1_FEEDRATE = 1000
-STEPS_PER_MM = 1
+FLATTEN_TOLERANCE = 0.1 # fraction of pen thickness
+FLATTEN_MIN_TOLERANCE = 0.01 # mm
+FLATTEN_MAX_DEPTH = 10
+CHAIN_TOLERANCE = 0.05 # mm
+DEDUP_TOLERANCE = 0.25 # fraction of pen thickness, 0 draws shared edges twice
+DEDUP_MIN_LENGTH = 2 # pen thicknesses, shorter overlaps (crossings, touching ends) are kept
+SIMPLIFY_TOLERANCE = 0.25 # fraction of pen thickness, 0 keeps every flattened point
+SIMPLIFY_DROP_DOTS = False # leave out strokes that fit inside the pen tip
+GCODE_WRITE_BATCH = 4096
+GCODE_COMPACT = True # fixed precision, only changed words, no zero-length or collinear moves
+GCODE_PRECISION = 3 # decimals in compact mode
+GCODE_MODAL_MOTION = False # compact mode leaves out repeated G0/G1, GRBL only (Marlin needs GCODE_MOTION_MODES)
 TRACING_FUNC = tracers.traceVTracer
+TRACE_TILE_SIZE = 0 # px, 0 traces the whole bitmap in one call
+TRACE_TILE_OVERLAP = 32 # px
+RASTER_PADDING = 2 # px of white around the traced footprint
+HATCH_MODE = None # None: outlines only, "hatch": parallel lines in dark regions, "cross": plus perpendicular ones
+HATCH_SPACING = 1.5 # pen thicknesses between hatch lines
+HATCH_ANGLE = 45 # degrees
+HATCH_THRESHOLD = 127 # gray level below which a region is filled
+HATCH_TOLERANCE = 0.5 # px, outline flattening for the scanline crossings
+HATCH_LINK_DISTANCE = 2 # hatch spacings a serpentine turn may shift sideways
+PREVIEW_SCALE = 1.0 # plan preview resolution relative to the bed bitmap, e.g. 0.25 for a quick look
+PREVIEW_TOLERANCE = 0.5 # preview px
+OVERLAY_STROKE_COLOR = (33, 115, 70, 255)
+OVERLAY_TRAVEL_COLOR = (192, 57, 43, 140)
+PLAN_POLL_INTERVAL = 100 # ms
+TRACE_CACHE_ENTRIES = 8
+TRACE_CACHE_DIR = None # e.g. "~/.cache/rastertrace", None keeps traces in memory only
+
+DEFAULT_SETTINGS = {
+    "bed_x": 200,
+    "bed_y": 150,
+    "pen_x": 0.0,
+    "pen_y": 0.0,
+    "pen_down": 1.0,
+    "pen_up": 2.0,
+    "pen_thickness": 1.0,
+    "pen_safety": 10.0,
+    "img_x": 0.0,
+    "img_y": 0.0,
+    "img_w": 100.0,
+    "img_h": 100.0
+}
+
+PLAN_STAGES = { # stage: (upstream stages, settings it reads), in dependency order
+    "raster": ((), ("bed_x", "bed_y", "img_x", "img_y", "img_w", "img_h", "pen_safety")),
+    "trace": (("raster",), ()),
+    "fill": (("trace",), ("pen_thickness",) if HATCH_MODE else ()),
+    "order": (("fill",), ()),
+    "toolpath": (("order",), ("pen_thickness",)),
+    "preview": (("order",), ("pen_thickness",)),
+    "gcode": (("toolpath",), ("pen_x", "pen_y", "pen_up", "pen_down"))
+}
 
 BACKGROUND_COLORS = {
     "ok": "#217346",
@@ -33,10 +99,23 @@ FOREGROUND_COLORS = {
 
 # Memory
 _ui_refs = None # set by main.py
-plan_gcode = None
+plan_toolpath = None
+plan_settings = None
+plan_version = 0 # counts changes of plan_toolpath or plan_settings, keys the editor's overlay
 plan_img = None
+plan_estimate = None # motion.estimateMotion of plan_toolpath with plan_settings, None until needed
+plan_curves = None # ordered curves of the last plan, reused while their settings hold
+plan_travel = None # pen-up travel (before, after) ordering plan_curves, in mm
+plan_curves_settings = None
+plan_image = None
+plan_process = None
+plan_events = None
+trace_cache = tracecache.TraceCache(TRACE_CACHE_ENTRIES, TRACE_CACHE_DIR)
 serial_con = None
-is_moving = False
+serial_connector = None
+serial_events = None
+motion_sender = None
+motion_events = None
 
 
 # Exception
@@ -46,16 +125,24 @@ class SoftError(Exception):
 
 # Events
 def _createPlanBtn():
-    if plan_img:
+    if plan_process:
+        cancelPlan()
+    elif plan_img:
         plan_img.show()
     else:
         createPlan()
 
 def _connectSerialBtn():
-    messagebox.showerror("Serial Error", "Serial Connection is not supported in this version.")
-    raise NotImplementedError()
-
     global serial_con
+    global serial_connector
+    global serial_events
+
+    if motion_sender:
+        messagebox.showwarning("Warning", "Abort the motion first.")
+        return
+
+    if serial_connector:
+        return # still connecting
 
     if serial_con and serial_con.is_open:
         serial_con.close()
@@ -63,83 +150,78 @@ def _connectSerialBtn():
         setPlanStatus("serial", "Disconnected", "error")
     else:
         setPlanStatus("serial", "Reconnecting", "neutral")
-        try:
-            serial_con = serial.Serial(SERIAL_PORT, SERIAL_BAUD_RATE, timeout=None)
-        except Exception as exception:
-            setPlanStatus("serial", "Error", "error")
-            messagebox.showerror("Serial Error", f"Unexpected error: {exception}")
-            traceback.print_exc()
-            return
-        
-        serial_con.write("G6 P100")
-        if "ok" not in serial_con.readline():
-            setPlanStatus("serial", "Invalid", "error")
-            messagebox.showerror("Serial Error", "Invalid device/firmware.")
-            return
-        
+        serial_events = queue.Queue()
+        serial_connector = sender.Connector(
+            functools.partial(serial.Serial, SERIAL_PORT, SERIAL_BAUD_RATE, timeout=SERIAL_TIMEOUT),
+            SERIAL_CONNECT_TIMEOUT,
+            serial_events
+        )
+        serial_connector.start()
+        _ui_refs["app"].root.after(MOTION_POLL_INTERVAL, _pollConnect)
+
+def _pollConnect():
+    """Wait for the connector's result"""
+    global serial_con
+    global serial_connector
+    global serial_events
+
+    try:
+        result = serial_events.get_nowait()
+    except queue.Empty:
+        _ui_refs["app"].root.after(MOTION_POLL_INTERVAL, _pollConnect)
+        return
+
+    serial_connector.join()
+    serial_connector = None
+    serial_events = None
+
+    if result[0] == "connected":
+        serial_con = result[1]
         setPlanStatus("serial", "Connected", "ok")
+    elif result[0] == "invalid":
+        setPlanStatus("serial", "Invalid", "error")
+        messagebox.showerror("Serial Error", "Invalid device/firmware.")
+    else:
+        setPlanStatus("serial", "Error", "error")
+        messagebox.showerror("Serial Error", f"Unexpected error: {result[1]}")
 
 def _beginMotionBtn():
-    raise NotImplementedError()
-
-    global is_moving
+    global motion_sender
+    global motion_events
 
-    if is_moving:
-        serial_con.write("M112".encode("utf-8"))
+    if motion_sender:
+        motion_sender.stop(emergency=True)
         messagebox.showwarning("Warning", "Emergency Stop.")
-        time.sleep(2)
-        serial_con.close()
         return
-    
-    if not plan_gcode:
+
+    if not plan_toolpath:
         messagebox.showwarning("Warning", "Create a plan first.")
         return
-    
+
     if not serial_con or not serial_con.is_open:
         messagebox.showwarning("Warning", "Connect serial first.")
         return
-    
-    is_moving = True
-    setPlanButton(2, "Abort Motion")
-    try:
-        _ui_refs["app"].update()
 
-        serial_con.write("G6 P100".encode("utf-8"))
-        if "ok" not in serial_con.readline():
-            setPlanStatus("serial", "Invalid", "error")
-            messagebox.showerror("Serial Error", "Device reported busy.")
-            return
-        
-        gcode_chunks = splitIntoChunks(plan_gcode.split("\n"))
-        start_time = time.time()
-        for chunk_i in range(len(gcode_chunks)):
-            chunk = gcode_chunks[chunk_i]
-
-            serial_con.write("\n".join(chunk).encode("utf-8"))
-            ok_counter = 0
-            while ok_counter != len(chunk):
-                if serial_con.readline() == "ok\n":
-                    ok_counter += 1
-                else:
-                    setPlanStatus("serial", "Invalid", "error")
-                    messagebox.showerror("Serial Error", "Device reported issue.")
-                    return
-            
-            progress = chunk_i / len(gcode_chunks)
-            pps = progress / (time.time() - start_time)
-            setPlanStatus("progress", f"{int(progress * 100)}%", "warn")
-            setPlanStatus("progress_bar", progress, "ok")
-            setPlanButton("eta", f"{seconds_to_string((1 - progress) / pps)}")
-        
-        setPlanStatus("progress_bar", 1, "ok")
-        setPlanStatus("progress", "100%", "ok")
-        return
-    finally:
-        is_moving = False
-        setPlanButton(2, "Begin Motion")
+    line_times, _ = planEstimate()
+    motion_events = queue.Queue()
+    motion_sender = sender.GcodeSender(
+        serial_con,
+        generateGcode(plan_toolpath, plan_settings),
+        motion_events,
+        protocol=SERIAL_PROTOCOL,
+        window=SERIAL_OK_WINDOW,
+        rx_buffer=SERIAL_RX_BUFFER,
+        line_numbers=SERIAL_LINE_NUMBERS,
+        total=len(line_times)
+    )
+    motion_sender.start()
+
+    setPlanButton(2, "Abort Motion")
+    setPlanStatus("progress_bar", 0, "ok")
+    _ui_refs["app"].root.after(MOTION_POLL_INTERVAL, _pollMotion, line_times)
 
 def _saveGcodeBtn():
-    if not plan_gcode:
+    if not plan_toolpath:
         messagebox.showwarning("Warning", "Create a plan first.")
         return
     
@@ -150,29 +232,121 @@ def _saveGcodeBtn():
     )
 
     if new_file:
-        new_file.write(plan_gcode)
-        new_file.close()
+        try:
+            writeGcode(generateGcode(plan_toolpath, plan_settings), new_file.write)
+        finally:
+            new_file.close()
 
 def _copyGcodeBtn():
-    if not plan_gcode:
+    if not plan_toolpath:
         messagebox.showwarning("Warning", "Create a plan first.")
         return
 
     _ui_refs["app"].root.clipboard_clear()
-    _ui_refs["app"].root.clipboard_append(plan_gcode)
+    writeGcode(generateGcode(plan_toolpath, plan_settings), _ui_refs["app"].root.clipboard_append)
     _ui_refs["app"].root.update()
 
+def _settingsChanged():
+    """Keep the plan if only G-code settings changed, otherwise drop its outputs"""
+    global plan_settings
+    global plan_version
+    global plan_estimate
+
+    if not plan_img:
+        return
+
+    try:
+        settings = readSettings()
+    except ValueError:
+        settings = None # half-typed field
+
+    if settings and _ui_refs["app"].current_image is plan_image and staleStages(plan_settings, settings) <= {"gcode"}:
+        if settings != plan_settings:
+            plan_settings = settings
+            plan_version += 1
+            plan_estimate = None
+            showEstimate(None)
+        return
+
+    _resetPlan()
+
+def _pollMotion(line_times):
+    """Drain the sender's events"""
+    global motion_sender
+    global motion_events
+    global serial_con
+
+    progress = None
+    result = None
+    try:
+        while not result:
+            event = motion_events.get_nowait()
+            if event[0] == "progress":
+                progress = event
+            else:
+                result = event
+    except queue.Empty:
+        pass
+
+    if progress and progress[1] and line_times[-1] > 0:
+        # acknowledged lines are planned, time along the estimate rather than by line count
+        done_time = line_times[progress[1] - 1]
+        fraction = done_time / line_times[-1]
+        setPlanStatus("progress_bar", fraction, "ok")
+        setPlanStatus("progress", int(fraction * 100), "warn")
+        setPlanStatus("eta", seconds_to_string(line_times[-1] - done_time), "neutral")
+
+    if not result:
+        _ui_refs["app"].root.after(MOTION_POLL_INTERVAL, _pollMotion, line_times)
+        return
+
+    emergency = motion_sender.emergency
+    motion_sender.join()
+    motion_sender = None
+    motion_events = None
+    setPlanButton(2, "Begin Motion")
+
+    if result[0] == "done":
+        setPlanStatus("progress_bar", 1, "ok")
+        setPlanStatus("progress", 100, "ok")
+        setPlanStatus("eta", seconds_to_string(0), "ok")
+    elif result[0] == "error":
+        setPlanStatus("serial", "Invalid", "error")
+        messagebox.showerror("Serial Error", f"Device reported issue: {result[1]}")
+
+    if emergency or result[0] == "error":
+        serial_con.close()
+        serial_con = None
+        setPlanStatus("serial", "Disconnected", "error")
+
+def stopMotion():
+    """Stop streaming without halting the machine, without touching the UI"""
+    if motion_sender:
+        motion_sender.stop()
+        motion_sender.join()
+
 def _resetPlan():
     global plan_img
-    global plan_gcode
+    global plan_toolpath
+    global plan_estimate
+    global plan_curves
+
+    if _ui_refs["app"].current_image is not plan_image:
+        plan_curves = None
 
     if not plan_img:
         return
 
     plan_img = None
-    plan_gcode = None
+    plan_toolpath = None
+    plan_estimate = None
+    _ui_refs["canvas"].delete("toolpath")
     setPlanButton(0, "Create Plan")
     setPlanStatus("planned", "No", "error")
+    setPlanStatus("eta", "-", "neutral")
+    setPlanStatus("draw_travel", "-", "neutral")
+    setPlanStatus("lifts", "-", "neutral")
+    setPlanStatus("travel", "-", "neutral")
 
 
 # Utility
@@ -189,6 +363,12 @@ def setPlanStatus(key, value, color_key):
         _ui_refs["progress_label"].config(text=f"{value}%", foreground=color)
     elif key == "eta":
         _ui_refs["eta_label"].config(text=str(value), foreground=color)
+    elif key == "draw_travel":
+        _ui_refs["draw_travel_label"].config(text=str(value), foreground=color)
+    elif key == "lifts":
+        _ui_refs["lifts_label"].config(text=str(value), foreground=color)
+    elif key == "travel":
+        _ui_refs["travel_label"].config(text=str(value), foreground=color)
     
     _ui_refs["app"].root.update()
 
@@ -202,188 +382,862 @@ def setPlanButton(id, newText):
 
     _ui_refs["app"].root.update()
 
+def readSettings():
+    """Snapshot of the editor's configuration and image placement"""
+    app = _ui_refs["app"]
+    return {
+        "bed_x": int(app.bed_x.get()),
+        "bed_y": int(app.bed_y.get()),
+        "pen_x": float(app.pen_x.get()),
+        "pen_y": float(app.pen_y.get()),
+        "pen_down": float(app.pen_down.get()),
+        "pen_up": float(app.pen_up.get()),
+        "pen_thickness": float(app.pen_thickness.get()),
+        "pen_safety": float(app.pen_safety.get()),
+        "img_x": app.img_x,
+        "img_y": app.img_y,
+        "img_w": app.img_w,
+        "img_h": app.img_h
+    }
+
+def planEstimate():
+    """Motion estimate of the current plan, recomputed after G-code settings changed"""
+    global plan_estimate
+
+    if plan_estimate is None:
+        plan_estimate = motion.estimateMotion(generateGcode(plan_toolpath, plan_settings))
+        showEstimate(plan_estimate[1])
+    return plan_estimate
+
+def showEstimate(summary):
+    """Total, draw/travel split and pen lifts of an estimate summary, "?" while it is outdated"""
+    if summary is None:
+        for key in ("eta", "draw_travel", "lifts"):
+            setPlanStatus(key, "?", "neutral")
+        return
+
+    setPlanStatus("eta", seconds_to_string(summary["total"]), "neutral")
+    setPlanStatus("draw_travel", f"{seconds_to_string(summary['draw'])} / {seconds_to_string(summary['travel'])}", "neutral")
+    setPlanStatus("lifts", summary["lifts"], "neutral")
+
+def fitImage(width, height, bed_x, bed_y):
+    """Initial image size (mm) for a freshly loaded image"""
+    ratio = width / height
+    if ratio > 1:
+        img_w = min(bed_x * 0.8, 100)
+        return img_w, img_w / ratio
+    else:
+        img_h = min(bed_y * 0.8, 100)
+        return img_h * ratio, img_h
+
 
 # Planning
 def createPlan():
-    global plan_img
-    global plan_gcode
+    """Start planning in a background process, _pollPlan picks up the result"""
+    global plan_process
+    global plan_events
 
     setPlanStatus("planned", "(?) Reading...", "warn")
 
     try:
-        bed_x = int(_ui_refs["app"].bed_x.get())
-        bed_y = int(_ui_refs["app"].bed_y.get())
-        img_w = _ui_refs["app"].img_w
-        img_h = _ui_refs["app"].img_h
-        img_x = _ui_refs["app"].img_x
-        img_y = _ui_refs["app"].img_y
-        pen_safety = int(float(_ui_refs["app"].pen_safety.get()) * PX_PER_MM)
+        settings = readSettings()
 
         if not _ui_refs["app"].current_image:
             messagebox.showwarning("Warning", "No image selected!")
             raise SoftError()
-
-        new_img = Image.new("RGB", (bed_x * PX_PER_MM, bed_y * PX_PER_MM), color=(255, 255, 255))
-
-        setPlanStatus("planned", "(?) Converting...", "warn")
-        converted_image = _ui_refs["app"].current_image.resize(
-            (
-                int(img_w * PX_PER_MM),
-                int(img_h * PX_PER_MM)
-            ),
-            Image.Resampling.BICUBIC
-        )
-
-        new_img.paste(converted_image, (
-            int((img_x + bed_x / 2 - img_w / 2) * PX_PER_MM),
-            int((img_y + bed_y / 2 - img_h / 2) * PX_PER_MM)
-        ))
-
-        draw = ImageDraw.Draw(new_img)
-        width, height = new_img.size
-        margin = int(pen_safety)
-        draw.rectangle([0, 0, width, margin], fill=(255, 255, 255))
-        draw.rectangle([0, height - margin, width, height], fill=(255, 255, 255))
-        draw.rectangle([0, 0, margin, height], fill=(255, 255, 255))
-        draw.rectangle([width - margin, 0, width, height], fill=(255, 255, 255))
-
-        setPlanStatus("planned", "(?) Tracing...", "warn")
-        bezier = TRACING_FUNC(new_img)
-        setPlanStatus("planned", "(?) Minimizing...", "warn")
-        bezier = tracers.minimizeAir(bezier)
-
-        setPlanStatus("planned", "(?) Viewing...", "warn")
-        plan_img = bezierToImg(bezier, new_img.size)
-
-        setPlanStatus("planned", "(?) Coding...", "warn")
-        plan_gcode = generateGcode(bezier, new_img.size)
     
     except SoftError:
-        plan_gcode = None
-        plan_img = None
         setPlanStatus("planned", "Warning", "warn")
+        return
     
     except Exception as exception:
-        plan_gcode = None
-        plan_img = None
         setPlanStatus("planned", "Error", "error")
         messagebox.showerror("Error", f"Unexpected error: {exception.__class__.__name__}")
         traceback.print_exc()
-    
-    else:
-        setPlanButton(0, "View Plan")
-        setPlanStatus("planned", "Yes", "ok")
+        return
+
+    image = _ui_refs["app"].current_image
+    curves = reusableCurves(image, settings)
+    cache = None
+    if curves is None and not isinstance(image, vectors.VectorImage):
+        cache = trace_cache.subset([traceKey(image, settings)])
+
+    plan_events = multiprocessing.Queue()
+    plan_process = multiprocessing.Process(
+        target=_planWorker,
+        args=(image, settings, plan_events, cache, curves)
+    )
+    plan_process.start()
+
+    setPlanButton(0, "Cancel Plan")
+    _ui_refs["app"].root.after(PLAN_POLL_INTERVAL, _pollPlan, image, settings)
+
+def reusableCurves(image, settings):
+    """Ordered curves of the last plan that still hold for settings (translated if only moved), or None"""
+    if plan_curves is None or image is not plan_image:
+        return None
+
+    old_settings = plan_curves_settings
+    stale = staleStages(old_settings, settings)
+    if "order" not in stale:
+        return plan_curves
 
-def bezierToImg(bezier, bitmap_size):
-    img = Image.new("1", bitmap_size, 1)
+    moved = {key for stage in ("raster", "fill") for key in PLAN_STAGES[stage][1] if old_settings[key] != settings[key]}
+    if not moved <= {"img_x", "img_y"}:
+        return None
+    if not (_insideMargin(old_settings) and _insideMargin(settings)):
+        return None
+
+    old_x, old_y, _, _ = imageBox(old_settings)
+    new_x, new_y, _, _ = imageBox(settings)
+    return plan_curves.translate((new_x - old_x, new_y - old_y))
+
+def staleStages(old_settings, settings):
+    """Plan stages whose output differs between two settings snapshots, downstream included"""
+    stale = set()
+    for stage, (inputs, keys) in PLAN_STAGES.items():
+        if any(upstream in stale for upstream in inputs) or any(old_settings[key] != settings[key] for key in keys):
+            stale.add(stage)
+    return stale
+
+def _insideMargin(settings):
+    x0, y0, x1, y1 = imageBox(settings)
+    margin = int(settings["pen_safety"] * PX_PER_MM)
+    width, height = bitmapSize(settings)
+    return x0 > margin and y0 > margin and x1 < width - margin and y1 < height - margin
+
+def cancelPlan():
+    if not plan_process:
+        return
+
+    stopPlan()
+    setPlanButton(0, "Create Plan")
+    setPlanStatus("planned", "Cancelled", "warn")
+
+def stopPlan():
+    """Terminate a running plan process, without touching the UI"""
+    if plan_process:
+        plan_process.terminate()
+        _finishPlan()
+
+def _finishPlan():
+    global plan_process
+    global plan_events
+
+    plan_process.join()
+    plan_events.close()
+    plan_process = None
+    plan_events = None
+
+def _pollPlan(image, settings):
+    """Drain the planning process' events, runs on the Tk main loop"""
+    global plan_img
+    global plan_toolpath
+    global plan_settings
+    global plan_version
+    global plan_estimate
+    global plan_curves
+    global plan_curves_settings
+    global plan_travel
+    global plan_image
+
+    if not plan_process:
+        return # cancelled
+
+    alive = plan_process.is_alive()
+    progress = None
+    result = None
+    try:
+        while not result:
+            event = plan_events.get_nowait()
+            if event[0] == "progress":
+                progress = event
+            elif event[0] == "cached":
+                trace_cache.update(event[1])
+            else:
+                result = event
+    except queue.Empty:
+        pass
+
+    if not result and not alive:
+        result = ("error", "ProcessError", "Planning process exited unexpectedly.")
+
+    if not result:
+        if progress:
+            setPlanStatus("planned", f"(?) {progress[1]} {int(progress[2] * 100)}%...", "warn")
+        _ui_refs["app"].root.after(PLAN_POLL_INTERVAL, _pollPlan, image, settings)
+        return
+
+    _finishPlan()
+    if result[0] != "done":
+        plan_img = None
+        plan_toolpath = None
+        setPlanButton(0, "Create Plan")
+        setPlanStatus("planned", "Error", "error")
+        messagebox.showerror("Error", f"Planning failed: {result[1]}", detail=result[2].strip().splitlines()[-1])
+        return
+
+    if _ui_refs["app"].current_image is not image:
+        # another image was loaded meanwhile
+        setPlanButton(0, "Create Plan")
+        setPlanStatus("planned", "No", "error")
+        return
+
+    # the ordered curves hold for the settings they were planned with, whatever came since
+    plan_curves, plan_curves_settings, plan_image = result[3], settings, image
+    plan_travel = result[5] or plan_travel # reused curves keep their order
+
+    try:
+        current_settings = readSettings()
+    except ValueError:
+        current_settings = None # half-typed field
+    if current_settings is None or staleStages(settings, current_settings) - {"gcode"}:
+        # moved or changed while planning, redo the affected stages
+        plan_img = None
+        plan_toolpath = None
+        if current_settings is None:
+            setPlanButton(0, "Create Plan")
+            setPlanStatus("planned", "No", "error")
+        else:
+            createPlan()
+        return
+
+    plan_img, plan_toolpath = result[1], result[2]
+    plan_settings = current_settings
+    plan_version += 1
+    plan_estimate = result[4] if current_settings == settings else None
+    showEstimate(plan_estimate[1] if plan_estimate else None)
+    setPlanStatus("travel", f"{plan_travel[0]:.0f} -> {plan_travel[1]:.0f}mm", "neutral")
+    _ui_refs["app"].draw()
+    setPlanButton(0, "View Plan")
+    setPlanStatus("planned", "Yes", "ok")
+
+def _planWorker(image, settings, events, cache=None, curves=None):
+    """Planning process entry point, reports through the events queue"""
+    last_progress = [None, 0]
+
+    def status(stage, fraction):
+        if stage == last_progress[0] and fraction - last_progress[1] < 0.01:
+            return
+        last_progress[:] = [stage, fraction]
+        events.put(("progress", stage, fraction))
+
+    try:
+        bezier, bitmap_size, toolpath, travel = computePlan(image, settings, status, cache, curves)
+        if cache is not None:
+            events.put(("cached", cache))
+        status("Estimating", 0)
+        estimate = motion.estimateMotion(generateGcode(toolpath, settings))
+        img = bezierToImg(bezier, bitmap_size, settings, functools.partial(status, "Viewing"))
+        events.put(("done", img, toolpath, bezier, estimate, travel))
+    except Exception as exception:
+        events.put(("error", exception.__class__.__name__, traceback.format_exc()))
+
+def computePlan(image, settings, status=None, cache=None, curves=None):
+    """Run the planning pipeline without any UI, returns curves, bitmap size, toolpath and pen-up travel (before, after) in mm"""
+    if status is None:
+        status = lambda stage, fraction: None
+
+    bitmap_size = bitmapSize(settings)
+    bezier = curves
+    bitmap = None
+    if bezier is None and isinstance(image, vectors.VectorImage):
+        status("Converting", 0)
+        bezier = placeVector(image, settings)
+    elif bezier is None:
+        key = traceKey(image, settings) if cache is not None else None
+        bezier = cache.get(key) if cache is not None else None
+        if bezier is None:
+            status("Converting", 0)
+            bitmap, origin = rasterizeImage(image, settings)
+
+            status("Tracing", 0)
+            if TRACE_TILE_SIZE:
+                bezier = tracers.traceTiled(bitmap, TRACING_FUNC, TRACE_TILE_SIZE, TRACE_TILE_OVERLAP, functools.partial(status, "Tracing"))
+            else:
+                bezier = TRACING_FUNC(bitmap, progress=functools.partial(status, "Tracing"))
+            bezier = tracers.dropFrame(bezier, bitmap.size).translate(origin)
+            if cache is not None:
+                cache.put(key, bezier)
+
+        if HATCH_MODE:
+            status("Filling", 0)
+            if bitmap is None:
+                bitmap, origin = rasterizeImage(image, settings)
+            spacing = settings["pen_thickness"] * HATCH_SPACING * PX_PER_MM
+            angles = (HATCH_ANGLE, HATCH_ANGLE + 90) if HATCH_MODE == "cross" else (HATCH_ANGLE,)
+            bezier = CurveSet.concatenate([bezier] + [hatchFill(bezier, bitmap, origin, spacing, angle) for angle in angles])
+
+    travel = None
+    if curves is None:
+        status("Minimizing", 0)
+        bezier, travel = tracers.minimizeAir(bezier, progress=functools.partial(status, "Minimizing"))
+        travel = (travel[0] / PX_PER_MM, travel[1] / PX_PER_MM)
+
+    status("Coding", 0)
+    toolpath = planToolpath(bezier, bitmap_size, settings, functools.partial(status, "Coding"))
+
+    return bezier, bitmap_size, toolpath, travel
+
+def traceKey(image, settings):
+    """Cache key of everything the traced curves depend on: pixels, placement, resolution and tracer"""
+    placement = tuple(float(settings[key]) for key in ("bed_x", "bed_y", "img_x", "img_y", "img_w", "img_h", "pen_safety"))
+    tracer_params = [(name, repr(getattr(tracers, name))) for name in tracers.TRACE_PARAMS]
+    tracer = (TRACING_FUNC.__module__, TRACING_FUNC.__qualname__, TRACE_TILE_SIZE, TRACE_TILE_OVERLAP, RASTER_PADDING)
+    return tracecache.cacheKey(image, placement, PX_PER_MM, tracer, tracer_params)
+
+def bitmapSize(settings):
+    return int(settings["bed_x"]) * PX_PER_MM, int(settings["bed_y"]) * PX_PER_MM
+
+def imageBox(settings):
+    """Pixel box (x0, y0, x1, y1) the placed image covers on the bed bitmap"""
+    img_w = settings["img_w"]
+    img_h = settings["img_h"]
+    x0 = int((settings["img_x"] + int(settings["bed_x"]) / 2 - img_w / 2) * PX_PER_MM)
+    y0 = int((settings["img_y"] + int(settings["bed_y"]) / 2 - img_h / 2) * PX_PER_MM)
+    return x0, y0, x0 + int(img_w * PX_PER_MM), y0 + int(img_h * PX_PER_MM)
+
+def rasterizeImage(image, settings):
+    """Rasterize the placed image inside the safety margin, returns the bitmap and its origin (x, y) on the bed bitmap"""
+    width, height = bitmapSize(settings)
+    margin = int(settings["pen_safety"] * PX_PER_MM)
+    x0, y0, x1, y1 = imageBox(settings)
+    clip_x0, clip_y0 = max(x0, margin + 1), max(y0, margin + 1)
+    clip_x1, clip_y1 = min(x1, width - margin), min(y1, height - margin)
+    clip_w, clip_h = max(clip_x1 - clip_x0, 0), max(clip_y1 - clip_y0, 0)
+
+    new_img = Image.new("RGB", (clip_w + 2 * RASTER_PADDING, clip_h + 2 * RASTER_PADDING), color=(255, 255, 255))
+
+    if clip_w and clip_h:
+        # resample only the visible part of the source image
+        scale_x = image.width / (x1 - x0)
+        scale_y = image.height / (y1 - y0)
+        converted_image = image.resize(
+            (clip_w, clip_h),
+            Image.Resampling.BICUBIC,
+            box=(
+                (clip_x0 - x0) * scale_x,
+                (clip_y0 - y0) * scale_y,
+                (clip_x1 - x0) * scale_x,
+                (clip_y1 - y0) * scale_y
+            )
+        )
+        new_img.paste(converted_image, (RASTER_PADDING, RASTER_PADDING))
+
+    return new_img, (clip_x0 - RASTER_PADDING, clip_y0 - RASTER_PADDING)
+
+def placeVector(image, settings):
+    """Scale and move vector artwork onto the bed bitmap, dropping curves that reach into the safety margin"""
+    bed_x = int(settings["bed_x"])
+    bed_y = int(settings["bed_y"])
+    img_w = settings["img_w"]
+    img_h = settings["img_h"]
+
+    scale = numpy.array((img_w / image.width, img_h / image.height)) * PX_PER_MM
+    offset = numpy.array((settings["img_x"] + bed_x / 2 - img_w / 2, settings["img_y"] + bed_y / 2 - img_h / 2)) * PX_PER_MM
+    points = image.curves.points * scale + offset
+
+    width, height = bitmapSize(settings)
+    margin = int(settings["pen_safety"] * PX_PER_MM)
+    inside = numpy.all((points > margin) & (points < (width - margin, height - margin)), axis=(1, 2))
+
+    return CurveSet(points, image.curves.layer, image.curves.stroke, tracers.CURVE_DTYPE)[inside]
+
+def bezierToImg(bezier, bitmap_size, settings, progress=None, scale=PREVIEW_SCALE):
+    """Draw the curves as the pen would, at scale times the bed bitmap's resolution"""
+    img = Image.new("1", (max(int(bitmap_size[0] * scale), 1), max(int(bitmap_size[1] * scale), 1)), 1)
     draw = ImageDraw.Draw(img)
 
-    thickness_px = int(float(_ui_refs["app"].pen_thickness.get()) * PX_PER_MM)
-    
-    for p0, c1, c2, p3 in bezier:
-        steps = 30
-        points = []
-        for t in numpy.linspace(0, 1, steps):
-            x = (1-t)**3*p0[0] + 3*(1-t)**2*t*c1[0] + 3*(1-t)*t**2*c2[0] + t**3*p3[0]
-            y = (1-t)**3*p0[1] + 3*(1-t)**2*t*c1[1] + 3*(1-t)*t**2*c2[1] + t**3*p3[1]
-            points.append((int(x), int(y)))
-        
-        if len(points) > 1:
-            for i in range(len(points) - 1):
-                draw.line([points[i], points[i + 1]], fill=0, width=thickness_px)
-    
+    thickness_px = max(int(settings["pen_thickness"] * PX_PER_MM * scale), 1)
+
+    curves = curvesToArray(bezier) * scale
+    if len(curves) == 0:
+        return img
+    points, counts = flattenCurves(curves, PREVIEW_TOLERANCE)
+
+    # strokes break where a curve does not start at the previous curve's end
+    stroke_starts = numpy.flatnonzero(numpy.any(curves[1:, 0] != curves[:-1, 3], axis=1)) + 1
+    curve_starts = numpy.cumsum(counts) - counts
+    strokes = numpy.split(points, curve_starts[stroke_starts])
+
+    for stroke_i, stroke in enumerate(strokes):
+        if progress and stroke_i % 1024 == 0:
+            progress(stroke_i / len(strokes))
+        draw.line(stroke.ravel().tolist(), fill=0, width=thickness_px, joint="curve" if thickness_px > 2 else None)
+
     return img
 
-_gcode_draft = ""
-def generateGcode(plan_lines, bitmap_size):
-    global _gcode_draft
-    _gcode_draft = ""
+def renderToolpath(toolpath, settings, view, zoom, size):
+    """Strokes and pen-up travel for the editor canvas, view is the canvas top left in workspace mm, zoom px per mm"""
+    img = Image.new("RGBA", size, (0, 0, 0, 0))
+    points, counts = toolpath
+    if len(counts) == 0:
+        return img
+    draw = ImageDraw.Draw(img)
 
-    def instr(instruction):
-        global _gcode_draft
-        _gcode_draft += instruction + "\n"
+    origin = (settings["bed_x"] / 2 + view[0], settings["bed_y"] / 2 + view[1])
+    pixels = numpy.rint((points - origin) * zoom).astype(numpy.int64)
+    stroke_ends = numpy.cumsum(counts)
+    stroke_starts = stroke_ends - counts
 
-    
-    bed_x = int(_ui_refs["app"].bed_x.get())
-    bed_y = int(_ui_refs["app"].bed_y.get())
-    pen_up = float(_ui_refs["app"].pen_up.get())
-    pen_down = float(_ui_refs["app"].pen_down.get())
-    pen_x = float(_ui_refs["app"].pen_x.get())
-    pen_y = float(_ui_refs["app"].pen_y.get())
+    keep = numpy.ones(len(pixels), dtype=bool)
+    keep[1:] = numpy.any(pixels[1:] != pixels[:-1], axis=1)
+    keep[stroke_starts] = True
+    kept_counts = numpy.add.reduceat(keep, stroke_starts)
+    kept_ends = numpy.cumsum(kept_counts)
+    kept = pixels[keep]
+
+    low = numpy.minimum.reduceat(pixels, stroke_starts)
+    high = numpy.maximum.reduceat(pixels, stroke_starts)
+    visible = numpy.all((high >= 0) & (low < size), axis=1)
+
+    # travel under the strokes, from each stroke's end to the next one's start
+    travel_from = pixels[stroke_ends[:-1] - 1]
+    travel_to = pixels[stroke_starts[1:]]
+    travel_visible = numpy.all((numpy.maximum(travel_from, travel_to) >= 0) & (numpy.minimum(travel_from, travel_to) < size), axis=1)
+    for line in numpy.concatenate((travel_from, travel_to), axis=1)[travel_visible].tolist():
+        draw.line(line, fill=OVERLAY_TRAVEL_COLOR)
+
+    for stroke_end, stroke_count in zip(kept_ends[visible].tolist(), kept_counts[visible].tolist()):
+        stroke = kept[stroke_end - stroke_count:stroke_end].ravel().tolist()
+        if stroke_count == 1:
+            draw.point(stroke, fill=OVERLAY_STROKE_COLOR)
+        else:
+            draw.line(stroke, fill=OVERLAY_STROKE_COLOR)
+
+    return img
+
+def hatchFill(curves, bitmap, origin, spacing, angle):
+    """Serpentine hatch lines every spacing px at angle degrees through the dark regions enclosed by curves"""
+    direction = numpy.array((numpy.cos(numpy.radians(angle)), numpy.sin(numpy.radians(angle))))
+    normal = numpy.array((-direction[1], direction[0]))
+
+    points, counts = flattenCurves(curvesToArray(curves), HATCH_TOLERANCE)
+    curve_ids = numpy.repeat(numpy.arange(len(counts)), counts)
+    edges = numpy.flatnonzero(curve_ids[1:] == curve_ids[:-1])
+    along, across = points @ direction, points @ normal / spacing - 0.5 # scanline k at across == k
+
+    # every crossing of an edge with a scanline, half open so shared vertices count once
+    across_a, across_b = across[edges], across[edges + 1]
+    first_line = numpy.ceil(numpy.minimum(across_a, across_b)).astype(numpy.int64)
+    line_n = numpy.maximum(numpy.ceil(numpy.maximum(across_a, across_b)).astype(numpy.int64) - first_line, 0)
+    crossing_edge = numpy.repeat(numpy.arange(len(edges)), line_n)
+    lines = numpy.arange(line_n.sum()) - numpy.repeat(numpy.cumsum(line_n) - line_n, line_n) + first_line[crossing_edge]
+    t = (lines - across_a[crossing_edge]) / (across_b - across_a)[crossing_edge]
+    along_a = along[edges][crossing_edge]
+    positions = along_a + t * (along[edges + 1][crossing_edge] - along_a)
+
+    order = numpy.lexsort((positions, lines))
+    lines, positions = lines[order], positions[order]
+
+    # pieces between neighbouring crossings, filled where the bitmap is dark
+    piece = numpy.flatnonzero((lines[1:] == lines[:-1]) & (positions[1:] - positions[:-1] > 1))
+    piece_lines, starts, ends = lines[piece], positions[piece], positions[piece + 1]
+    middles = numpy.outer((starts + ends) / 2, direction) + numpy.outer((piece_lines + 0.5) * spacing, normal) - origin
+    pixels = numpy.asarray(bitmap.convert("L"))
+    x = numpy.clip(middles[:, 0].astype(numpy.int64), 0, pixels.shape[1] - 1)
+    y = numpy.clip(middles[:, 1].astype(numpy.int64), 0, pixels.shape[0] - 1)
+    dark = pixels[y, x] < HATCH_THRESHOLD
+    piece_lines, starts, ends = piece_lines[dark], starts[dark], ends[dark]
+    if len(piece_lines) == 0:
+        return CurveSet()
+
+    # the previous scanline's pieces overlapping each piece, with every scanline shifted
+    # beyond the last so all pieces are sorted and disjoint in one array
+    line_shift = ends.max() - starts.min() + 1
+    shift = line_shift * (piece_lines - piece_lines.min())
+    shifted_starts, shifted_ends = starts + shift, ends + shift
+    low = numpy.searchsorted(shifted_ends, shifted_starts - line_shift, "right")
+    high = numpy.searchsorted(shifted_starts, shifted_ends - line_shift, "left")
+    single = high - low == 1
+    previous = numpy.where(single, low, -1)
+    linked = single & (numpy.bincount(previous[single], minlength=len(starts))[numpy.maximum(previous, 0)] == 1)
+    previous[~linked] = -1
+
+    # alternate direction along each chain
+    forward = (piece_lines - piece_lines[_chainHeads(previous)]) % 2 == 0
+    piece_first = numpy.where(forward, starts, ends)
+    piece_last = numpy.where(forward, ends, starts)
+
+    # turns that shift too far sideways would leave the region, start a new stroke there
+    far = numpy.abs(piece_first - piece_last[previous]) > HATCH_LINK_DISTANCE * spacing
+    previous[(previous >= 0) & far] = -1
+    stroke = numpy.searchsorted(numpy.flatnonzero(previous < 0), _chainHeads(previous))
+    order = numpy.lexsort((piece_lines, stroke))
+
+    ends_along = numpy.stack((piece_first, piece_last), axis=1)[order].ravel()
+    ends_across = numpy.repeat((piece_lines[order] + 0.5) * spacing, 2)
+    vertices = numpy.outer(ends_along, direction) + numpy.outer(ends_across, normal)
+    vertex_strokes = numpy.repeat(stroke[order], 2)
+    segments = numpy.flatnonzero(vertex_strokes[1:] == vertex_strokes[:-1])
+
+    start, end = vertices[segments], vertices[segments + 1]
+    chords = end - start
+    return CurveSet(
+        numpy.stack((start, start + chords / 3, end - chords / 3, end), axis=1),
+        None, vertex_strokes[segments], curves.points.dtype
+    )
+
+def _chainHeads(previous):
+    """First element of every chain given each element's predecessor (-1 for none), by pointer jumping"""
+    head = numpy.where(previous >= 0, previous, numpy.arange(len(previous)))
+    while True:
+        next_head = head[head]
+        if numpy.array_equal(next_head, head):
+            return head
+        head = next_head
+
+def planToolpath(plan_lines, bitmap_size, settings, progress=None):
+    """Flatten bitmap-space curves into bed-space strokes: points in mm (P, 2) and per-stroke point counts (S,), the layout the stroke passes below share"""
+    bed_x = settings["bed_x"]
+    bed_y = settings["bed_y"]
+    pen_thickness = settings["pen_thickness"]
 
     pos_factor = numpy.array((
         1 / bitmap_size[0] * bed_x,
         1 / bitmap_size[1] * bed_y
     ))
+    tolerance = max(pen_thickness * FLATTEN_TOLERANCE, FLATTEN_MIN_TOLERANCE) / pos_factor.max()
+
+    curves = curvesToArray(plan_lines)
+    points, counts = flattenCurves(curves, tolerance)
+    if progress:
+        progress(0.5)
 
+    points, counts = chainStrokes(points * pos_factor, counts, CHAIN_TOLERANCE)
+    points, counts = dropCoincident(points, counts, pen_thickness * DEDUP_TOLERANCE, pen_thickness * DEDUP_MIN_LENGTH)
+    return simplifyStrokes(points, counts, pen_thickness * SIMPLIFY_TOLERANCE, pen_thickness if SIMPLIFY_DROP_DOTS else 0)
 
-    instr("G21") # Unit: mm
-    instr("G90") # Absolute Positioning
-    instr("G28") # Calibrate Steppers
-    instr(f"G0 F{G0_FEEDRATE}") # G0 Speed
-    instr(f"G1 F{G1_FEEDRATE}") # G1 Speed
+def dropCoincident(points, counts, tolerance, min_length):
+    """Cut out stretches of at least min_length that retrace a lower stroke within tolerance"""
+    if tolerance <= 0 or len(counts) < 2:
+        return points, counts
 
-    instr(f"G0 X{bed_x / 2} Y{bed_y / 2} Z150") # top center
+    stroke_ids = numpy.repeat(numpy.arange(len(counts)), counts)
+    segments = numpy.flatnonzero(stroke_ids[1:] == stroke_ids[:-1]) # segment i: point i to i + 1
+    starts, chords = points[segments], points[segments + 1] - points[segments]
+    lengths = numpy.hypot(*chords.T)
 
-    continuous_transition = False
-    for curve_i in range(len(plan_lines)):
-        curve = plan_lines[curve_i]
+    sample_counts = numpy.ceil(lengths / (tolerance / 2)).astype(numpy.int64) + 1
+    sample_starts = numpy.cumsum(sample_counts) - sample_counts
+    sample_segment = numpy.repeat(numpy.arange(len(segments)), sample_counts)
+    t = (numpy.arange(sample_counts.sum()) - sample_starts[sample_segment]) / numpy.maximum(sample_counts - 1, 1)[sample_segment]
+    samples = starts[sample_segment] + t[:, None] * chords[sample_segment]
+    # only strokes with lower ids count, a stroke that retraces itself keeps both passes
+    near = spatial.lowerNeighbours(samples, stroke_ids[segments][sample_segment], tolerance)
+    covered = numpy.logical_and.reduceat(near, sample_starts)
 
-        steps_n = int(bezierLength(curve) / STEPS_PER_MM)
+    # runs of adjacent segments that are all covered or all not
+    run_starts = numpy.ones(len(segments), dtype=bool)
+    run_starts[1:] = (covered[1:] != covered[:-1]) | (segments[1:] != segments[:-1] + 1)
+    run_ids = numpy.cumsum(run_starts) - 1
+    dropped = covered & (numpy.bincount(run_ids, weights=lengths)[run_ids] >= min_length)
+    if not dropped.any():
+        return points, counts
 
-        start_pos = curve[0] * pos_factor
-        end_pos = curve[3] * pos_factor
-        if not continuous_transition:
-            instr(f"G0 X{start_pos[0] - pen_x} Y{start_pos[1] - pen_y} Z{pen_up}")
+    # new strokes: runs of kept segments plus the untouched single point strokes
+    kept = segments[~dropped]
+    piece_starts = numpy.ones(len(kept), dtype=bool)
+    piece_starts[1:] = kept[1:] != kept[:-1] + 1
+    piece_ends = numpy.append(piece_starts[1:], True)
+    singles = numpy.flatnonzero(counts == 1)
+    firsts = numpy.concatenate((kept[piece_starts], (numpy.cumsum(counts) - 1)[singles]))
+    lasts = numpy.concatenate((kept[piece_ends] + 1, (numpy.cumsum(counts) - 1)[singles]))
+    order = numpy.argsort(firsts, kind="stable")
+    firsts, lasts = firsts[order], lasts[order]
 
-        for step_i in range(steps_n + 1):
-            if continuous_transition:
-                continuous_transition = False
+    new_counts = lasts - firsts + 1
+    new_starts = numpy.cumsum(new_counts) - new_counts
+    taken = numpy.arange(new_counts.sum()) - numpy.repeat(new_starts - firsts, new_counts)
+    return points[taken], new_counts
+
+def simplifyStrokes(points, counts, tolerance, min_size=0):
+    """Ramer-Douglas-Peucker on all strokes at once, dropping strokes smaller than min_size both ways"""
+    if len(counts) == 0:
+        return points, counts
+
+    stroke_ends = numpy.cumsum(counts)
+    if min_size > 0:
+        size = numpy.maximum.reduceat(points, stroke_ends - counts) - numpy.minimum.reduceat(points, stroke_ends - counts)
+        visible = numpy.any(size >= min_size, axis=1)
+        points, counts = points[numpy.repeat(visible, counts)], counts[visible]
+        stroke_ends = numpy.cumsum(counts)
+        if len(counts) == 0:
+            return points, counts
+    stroke_starts = stroke_ends - counts
+
+    keep = numpy.zeros(len(points), dtype=bool)
+    keep[stroke_starts] = keep[stroke_ends - 1] = True
+    if tolerance <= 0:
+        keep[:] = True
+
+    xs, ys = numpy.ascontiguousarray(points.T)
+    long = counts > 2
+    first, last = stroke_starts[long], stroke_ends[long] - 1
+    while len(first) and tolerance > 0:
+        inner_counts = last - first - 1
+        inner_starts = numpy.cumsum(inner_counts) - inner_counts
+        segment = numpy.repeat(numpy.arange(len(first)), inner_counts)
+        inner = numpy.arange(inner_counts.sum()) - inner_starts[segment] + first[segment] + 1
+
+        # distance to the segment, not its line, so closed strokes split too
+        start_x, start_y = xs[first][segment], ys[first][segment]
+        chord_x, chord_y = xs[last][segment] - start_x, ys[last][segment] - start_y
+        offset_x, offset_y = xs[inner] - start_x, ys[inner] - start_y
+        chord_sq = chord_x * chord_x + chord_y * chord_y
+        t = numpy.clip((offset_x * chord_x + offset_y * chord_y) / numpy.where(chord_sq > 0, chord_sq, 1), 0, 1)
+        distance = numpy.hypot(offset_x - t * chord_x, offset_y - t * chord_y)
+
+        farthest_distance = numpy.maximum.reduceat(distance, inner_starts)
+        at_farthest = numpy.flatnonzero(distance == farthest_distance[segment])
+        _, first_at = numpy.unique(segment[at_farthest], return_index=True)
+        farthest = inner[at_farthest[first_at]]
+
+        split = farthest_distance > tolerance
+        keep[farthest[split]] = True
+        first = numpy.concatenate((first[split], farthest[split]))
+        last = numpy.concatenate((farthest[split], last[split]))
+        long = last - first > 1
+        first, last = first[long], last[long]
+
+    return points[keep], numpy.add.reduceat(keep, stroke_starts)
+
+def chainStrokes(points, counts, tolerance):
+    """Join strokes whose ends lie within tolerance, preferring the next stroke in order"""
+    stroke_n = len(counts)
+    stroke_ends = numpy.cumsum(counts)
+    stroke_starts = stroke_ends - counts
+    if stroke_n == 0:
+        return points, counts
+
+    heads = points[stroke_starts]
+    tails = points[stroke_ends - 1]
+    gaps = numpy.hypot(*(heads[1:] - tails[:-1]).T)
+    continues = (gaps <= tolerance).tolist() + [False]
+
+    endpoints = numpy.concatenate((heads, tails)) # as in tracers._nearestNeighbourTour
+    grid = spatial.PointGrid(endpoints, max(tolerance, spatial.cellSize(endpoints)))
+    alive = numpy.ones(len(endpoints), dtype=bool)
+
+    order = []
+    flips = []
+    chained = []
+    next_stroke = 0
+    while len(order) < stroke_n:
+        while not alive[next_stroke]:
+            next_stroke += 1
+
+        stroke, flip, chain = next_stroke, False, False
+        while True:
+            order.append(stroke)
+            flips.append(flip)
+            chained.append(chain)
+            alive[stroke] = alive[stroke + stroke_n] = False
+
+            if not flip and continues[stroke] and alive[stroke + 1]:
+                stroke, chain = stroke + 1, True
                 continue
-            else:
-                pos = bezierPos(
-                    step_i / steps_n,
-                    curve[0], curve[1], curve[2], curve[3]
-                ) * pos_factor
-                instr(f"G1 X{pos[0] - pen_x} Y{pos[1] - pen_y} Z{pen_down}")
-
-        if curve_i + 1 != len(plan_lines) and numpy.array_equal(plan_lines[curve_i + 1][0] * pos_factor, end_pos):
-            continuous_transition = True
-        else:
-            instr(f"G0 X{end_pos[0] - pen_x} Y{end_pos[1] - pen_y} Z{pen_up}")
 
-    instr(f"G0 X{bed_x / 2} Y{bed_y / 2} Z150") # top center
+            x, y = (heads if flip else tails)[stroke]
+            found, _ = grid.nearest(x, y, radius=tolerance, alive=alive)
+            if len(found) == 0:
+                break
+
+            stroke, flip, chain = int(found[0]) % stroke_n, bool(found[0] >= stroke_n), True
+
+    order = numpy.array(order)
+    flips = numpy.array(flips)
+    chained = numpy.array(chained)
+
+    # gather points stroke by stroke, reversed strokes backwards
+    ordered_counts = counts[order]
+    offsets = numpy.arange(ordered_counts.sum()) - numpy.repeat(numpy.cumsum(ordered_counts) - ordered_counts, ordered_counts)
+    reversed_points = numpy.repeat(flips, ordered_counts)
+    offsets[reversed_points] = (numpy.repeat(ordered_counts, ordered_counts) - 1 - offsets)[reversed_points]
+    chained_points = points[numpy.repeat(stroke_starts[order], ordered_counts) + offsets]
+
+    # a chained stroke that starts exactly on the previous end repeats that point
+    first_points = numpy.cumsum(ordered_counts) - ordered_counts
+    duplicate = chained.copy()
+    duplicate[1:] &= numpy.all(chained_points[first_points[1:]] == chained_points[first_points[1:] - 1], axis=1)
+    duplicate[0] = False
+    keep = numpy.ones(len(chained_points), dtype=bool)
+    keep[first_points[duplicate]] = False
+
+    chain_index = numpy.cumsum(~chained) - 1
+    chain_counts = numpy.bincount(chain_index, weights=ordered_counts - duplicate)
+
+    return chained_points[keep], chain_counts.astype(numpy.int64)
+
+def generateGcode(toolpath, settings):
+    """Yield the G-code program for a toolpath line by line, without newlines."""
+    bed_x = settings["bed_x"]
+    bed_y = settings["bed_y"]
+    pen_up = settings["pen_up"]
+    pen_down = settings["pen_down"]
+    pen_x = settings["pen_x"]
+    pen_y = settings["pen_y"]
+
+    points, counts = toolpath
+    stroke_ends = numpy.cumsum(counts)
+
+    yield "G21" # Unit: mm
+    yield "G90" # Absolute Positioning
+    yield "G28" # Calibrate Steppers
+    yield f"G0 F{G0_FEEDRATE}" # G0 Speed
+    yield f"G1 F{G1_FEEDRATE}" # G1 Speed
+
+    if GCODE_COMPACT:
+        yield from compactMoves(points - (pen_x, pen_y), counts, settings)
+        return
+
+    yield f"G0 X{bed_x / 2} Y{bed_y / 2} Z150" # top center
+
+    for stroke_start, stroke_end in zip((stroke_ends - counts).tolist(), stroke_ends.tolist()):
+        stroke = (points[stroke_start:stroke_end] - (pen_x, pen_y)).tolist()
 
-    return _gcode_draft
+        yield f"G0 X{stroke[0][0]} Y{stroke[0][1]} Z{pen_up}"
+        for pos in stroke:
+            yield f"G1 X{pos[0]} Y{pos[1]} Z{pen_down}"
+        yield f"G0 X{stroke[-1][0]} Y{stroke[-1][1]} Z{pen_up}"
+
+    yield f"G0 X{bed_x / 2} Y{bed_y / 2} Z150" # top center
+
+def compactMoves(points, counts, settings):
+    """The moves of generateGcode in GCODE_PRECISION decimals, naming only the axes that change"""
+    scale = 10 ** GCODE_PRECISION
+    grid = numpy.rint(points * scale).astype(numpy.int64)
+    stroke_ids = numpy.repeat(numpy.arange(len(counts)), counts)
+
+    keep = numpy.ones(len(grid), dtype=bool)
+    keep[1:] = numpy.any(grid[1:] != grid[:-1], axis=1) | (stroke_ids[1:] != stroke_ids[:-1])
+    grid, stroke_ids = grid[keep], stroke_ids[keep]
+
+    # exact collinearity on the integer grid, so dropped runs never drift off the line
+    before = grid[1:-1] - grid[:-2]
+    after = grid[2:] - grid[1:-1]
+    straight = (
+        (before[:, 0] * after[:, 1] == before[:, 1] * after[:, 0]) &
+        (numpy.einsum("nd,nd->n", before, after) > 0) &
+        (stroke_ids[1:-1] == stroke_ids[:-2]) & (stroke_ids[1:-1] == stroke_ids[2:])
+    )
+    keep = numpy.ones(len(grid), dtype=bool)
+    keep[1:-1] = ~straight
+    grid, stroke_ids = grid[keep], stroke_ids[keep]
+
+    def number(value):
+        if not value:
+            return "0" # also -0.0
+        text = f"{value:.{GCODE_PRECISION}f}"
+        return text.rstrip("0").rstrip(".") if "." in text else text
+
+    coords = [number(value) for value in (grid / scale).ravel().tolist()]
+    pen_up = number(settings["pen_up"])
+    pen_down = number(settings["pen_down"])
+    center_x = number(settings["bed_x"] / 2)
+    center_y = number(settings["bed_y"] / 2)
+
+    state = {}
+    def move(command, **axes):
+        words = [f"{axis}{value}" for axis, value in axes.items() if state.get(axis) != value]
+        if not words:
+            return None
+        state.update(axes)
+        if command != state.get("G") or not GCODE_MODAL_MOTION:
+            words.insert(0, command)
+            state["G"] = command
+        return " ".join(words)
+
+    stroke_ends = numpy.flatnonzero(numpy.diff(stroke_ids, append=len(counts))) + 1
+    stroke_starts = numpy.concatenate(([0], stroke_ends[:-1]))
+    yield move("G0", X=center_x, Y=center_y, Z="150") # top center
+
+    lines = []
+    for stroke_start, stroke_end in zip(stroke_starts.tolist(), stroke_ends.tolist()):
+        lines.append(move("G0", X=coords[2 * stroke_start], Y=coords[2 * stroke_start + 1], Z=pen_up))
+        lines.append(move("G1", Z=pen_down))
+        for point_i in range(stroke_start + 1, stroke_end):
+            lines.append(move("G1", X=coords[2 * point_i], Y=coords[2 * point_i + 1]))
+        lines.append(move("G0", Z=pen_up))
+        yield from filter(None, lines)
+        lines.clear()
+
+    yield from filter(None, [move("G0", X=center_x, Y=center_y, Z="150")]) # top center
+
+def writeGcode(lines, write):
+    """Drain a G-code line iterator into any write(str) callable in bounded batches"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) == GCODE_WRITE_BATCH:
+            write("\n".join(batch) + "\n")
+            batch.clear()
+
+    if batch:
+        write("\n".join(batch) + "\n")
 
 # Math
-def bezierPos(t, p0, c1, c2, p3):
-    p0, c1, c2, p3 = numpy.array(p0), numpy.array(c1), numpy.array(c2), numpy.array(p3)
-    return (1-t)**3 * p0 + 3*(1-t)**2*t * c1 + 3*(1-t)*t**2 * c2 + t**3 * p3
+def curvesToArray(curves):
+    """CurveSet or list of [p0, c1, c2, p3] -> contiguous (N, 4, 2) float64 array"""
+    return numpy.asarray(curves, dtype=numpy.float64).reshape(-1, 4, 2)
 
-def bezierLength(control_points, samples=100):
-    t_values = numpy.linspace(0, 1, samples)
-    p0, c1, c2, p3 = control_points
-    
-    curve_points = numpy.array([bezierPos(t, p0, c1, c2, p3) for t in t_values])
-    
-    return numpy.sum(numpy.linalg.norm(numpy.diff(curve_points, axis=0), axis=1))
+def bezierDeviation(curves):
+    """Upper bound of each curve's distance to its chord, from its control points"""
+    p0, p3 = curves[:, 0], curves[:, 3]
+    chord = p3 - p0
+    chord_sq = numpy.einsum("nd,nd->n", chord, chord)
+    chord_sq[chord_sq == 0] = 1
 
-def splitIntoChunks(lst, x):
-    chunk_size = len(lst) // x
-    remainder = len(lst) % x
-    
-    chunks = []
-    start = 0
-    
-    for i in range(x):
-        end = start + chunk_size + (1 if i < remainder else 0)
-        chunks.append(lst[start:end])
-        start = end
-    
-    return chunks
+    deviation = numpy.zeros(len(curves))
+    for control in (curves[:, 1], curves[:, 2]):
+        t = numpy.clip(numpy.einsum("nd,nd->n", control - p0, chord) / chord_sq, 0, 1)
+        deviation = numpy.maximum(deviation, numpy.linalg.norm(control - p0 - t[:, None] * chord, axis=1))
+
+    return deviation
+
+def flattenCurves(curves, tolerance):
+    """Subdivide every curve until it deviates less than tolerance from its chords, returns points (P, 2) and per-curve counts (N,)"""
+    pending = curves
+    pending_index = numpy.arange(len(curves))
+    pending_t = numpy.zeros(len(curves))
+
+    segment_index = []
+    segment_t = []
+    segment_end = []
+    for depth in range(FLATTEN_MAX_DEPTH + 1):
+        flat = bezierDeviation(pending) <= tolerance
+        if depth == FLATTEN_MAX_DEPTH:
+            flat[:] = True
+
+        segment_index.append(pending_index[flat])
+        segment_t.append(pending_t[flat])
+        segment_end.append(pending[flat, 3])
+
+        split = ~flat
+        if not split.any():
+            break
+
+        left, right = bezierSplit(pending[split])
+        pending = numpy.concatenate((left, right))
+        pending_index = numpy.tile(pending_index[split], 2)
+        pending_t = numpy.concatenate((pending_t[split], pending_t[split] + 0.5 ** (depth + 1)))
+
+    segment_index = numpy.concatenate(segment_index)
+    order = numpy.lexsort((numpy.concatenate(segment_t), segment_index))
+
+    counts = numpy.bincount(segment_index, minlength=len(curves)) + 1
+    curve_starts = numpy.cumsum(counts) - counts
+
+    points = numpy.empty((counts.sum(), 2))
+    is_end = numpy.ones(len(points), dtype=bool)
+    is_end[curve_starts] = False
+    points[curve_starts] = curves[:, 0]
+    points[is_end] = numpy.concatenate(segment_end)[order]
+
+    return points, counts
 
 def seconds_to_string(seconds):
+    seconds = int(round(seconds))
     h = seconds // 3600
     m = (seconds % 3600) // 60
     s = seconds % 60
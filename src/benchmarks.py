@@ -0,0 +1,331 @@
+import sys
+import time
+import resource
+import multiprocessing
+import numpy
+from PIL import Image, ImageDraw
+
+import backend
+import tracers
+from curves import CurveSet
+
+
+# Utility
+def randomCurves(n, seed=0, size=1600):
+    rng = numpy.random.default_rng(seed)
+    starts = rng.uniform(0, size, (n, 1, 2))
+    return numpy.concatenate((
+        starts,
+        starts + rng.uniform(-20, 20, (n, 3, 2))
+    ), axis=1)
+
+def randomBitmap(width, height, seed=0):
+    rng = numpy.random.default_rng(seed)
+    img = Image.new("RGB", (width, height), color=(255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for _ in range(width * height // 20000):
+        x, y = rng.uniform(0, width), rng.uniform(0, height)
+        radius = rng.uniform(10, 80)
+        draw.ellipse((x, y, x + radius, y + radius * 0.7), outline=(0, 0, 0), width=6)
+    return img
+
+def inProcess(func, *args):
+    """Run func in a fresh process, returns (result, seconds, peak RSS in MB)"""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(_measured, (func, *args))
+
+def _measured(func, *args):
+    result, seconds = timed(func, *args)
+    return result, seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def timed(func, *args):
+    start_time = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start_time
+
+
+# Legacy reference code
+def bezierPos(t, p0, c1, c2, p3):
+    p0, c1, c2, p3 = numpy.array(p0), numpy.array(c1), numpy.array(c2), numpy.array(p3)
+    return (1-t)**3 * p0 + 3*(1-t)**2*t * c1 + 3*(1-t)*t**2 * c2 + t**3 * p3
+
+def _spPoint_to_numpy(spPoint): # svg.path
+    return numpy.array((spPoint.real, spPoint.imag))
+
+
+# Benchmarks
+def benchFlatten(n=5000, tolerance=0.8):
+    """Per-point uniform bezierPos sampling vs. batched adaptive flattenCurves"""
+    curves = randomCurves(n)
+
+    def legacy(curves, steps_per_px=1):
+        points = []
+        for curve in curves:
+            samples = numpy.array([bezierPos(t, *curve) for t in numpy.linspace(0, 1, 100)])
+            steps_n = max(int(numpy.sum(numpy.linalg.norm(numpy.diff(samples, axis=0), axis=1)) / steps_per_px), 1)
+            for step_i in range(steps_n + 1):
+                points.append(bezierPos(step_i / steps_n, *curve))
+        return numpy.array(points)
+
+    legacy_points, legacy_time = timed(legacy, curves)
+    (batch_points, _), batch_time = timed(backend.flattenCurves, curves, tolerance)
+
+    print(f"flatten: {n} curves, tolerance {tolerance}px")
+    print(f"  legacy  {legacy_time:8.3f}s {len(legacy_points):8} points")
+    print(f"  batched {batch_time:8.3f}s {len(batch_points):8} points ({legacy_time / batch_time:.0f}x)")
+
+
+def _legacyVTracer(width, height):
+    import vtracer
+    new_img = randomBitmap(width, height).convert("L").convert("RGBA")
+    pixels = list(new_img.getdata())
+    return len(vtracer.convert_pixels_to_svg(
+        rgba_pixels=pixels,
+        size=new_img.size,
+        colormode="color",
+        hierarchical="cutout",
+        mode="spline",
+        corner_threshold=60,
+        length_threshold=4.0,
+        max_iterations=10,
+        splice_threshold=45,
+        color_precision=tracers.VTRACER_COLOR_PRECISION,
+        layer_difference=tracers.VTRACER_LAYER_DIFFERENCE,
+        path_precision=tracers.VTRACER_PATH_PRECISION
+    ))
+
+def _bufferVTracer(width, height):
+    return len(tracers.traceVTracer(randomBitmap(width, height)))
+
+def benchVTracer(width=3200, height=2400):
+    """Pixel tuple list vs. encoded buffer hand-off to vtracer, each in a fresh process.
+    The buffer run is the whole traceVTracer, SVG parsing included."""
+    print(f"vtracer: {width}x{height} bitmap")
+    for name, func in (("tuples", _legacyVTracer), ("buffer", _bufferVTracer)):
+        _, seconds, peak_rss = inProcess(func, width, height)
+        print(f"  {name:7} {seconds:8.3f}s {peak_rss:8.0f}MB peak RSS")
+
+
+def benchSvgParse(width=3200, height=2400):
+    """svg.path per segment vs. the vectorized vtracer SVG parser"""
+    import io
+    import vtracer
+    import svg.path as svgpath
+    from xml.etree import cElementTree
+
+    img_buffer = io.BytesIO()
+    randomBitmap(width, height).convert("L").save(img_buffer, format="BMP")
+    svg = vtracer.convert_raw_image_to_svg(img_buffer.getvalue(), img_format="bmp", colormode="color", hierarchical="cutout", mode="spline")
+
+    def legacy(svg):
+        bezier_curves = []
+        for element in cElementTree.fromstring(svg):
+            if not element.tag.endswith("path"):
+                continue
+            path_tf = tracers._vtTransform_to_numpy(element.get("transform"))
+            for segment in svgpath.parse_path(element.get("d")):
+                if type(segment) == svgpath.CubicBezier:
+                    bezier_curves.append([
+                        _spPoint_to_numpy(point) + path_tf
+                        for point in (segment.start, segment.control1, segment.control2, segment.end)
+                    ])
+        return bezier_curves
+
+    legacy_curves, legacy_time = timed(legacy, svg)
+    curves, parse_time = timed(tracers.parseVTracerSvg, svg)
+
+    print(f"svgparse: {len(svg) / 1e6:.1f}MB SVG")
+    print(f"  svg.path   {legacy_time:8.3f}s {len(legacy_curves):8} curves")
+    print(f"  vectorized {parse_time:8.3f}s {len(curves):8} curves ({legacy_time / parse_time:.0f}x)")
+
+
+def benchCurveMemory(n=200000):
+    """Lists of per-point numpy arrays vs. CurveSet storage, traced allocations"""
+    import tracemalloc
+    curves = randomCurves(n).tolist()
+    print(f"curvememory: {n} curves")
+
+    def legacy(curves):
+        return [[numpy.array(point) for point in curve] for curve in curves]
+
+    for name, func in (("lists", legacy), ("float64", CurveSet), ("float32", lambda curves: CurveSet(curves, dtype=numpy.float32))):
+        tracemalloc.start()
+        result, seconds = timed(func, curves)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"  {name:7} {seconds:8.3f}s {size / 1e6:8.1f}MB {size / n:6.0f}B/curve")
+        del result
+
+
+def benchTraceCache(width=3200, height=2400):
+    """Cold plan vs. repeat plan of the same artwork through the trace cache"""
+    import tracecache
+    image = randomBitmap(width, height)
+    settings = dict(backend.DEFAULT_SETTINGS)
+    settings["img_w"], settings["img_h"] = backend.fitImage(width, height, settings["bed_x"], settings["bed_y"])
+    cache = tracecache.TraceCache(backend.TRACE_CACHE_ENTRIES)
+
+    print(f"tracecache: {width}x{height} image")
+    for name in ("cold", "cached"):
+        (curves, _, _, _), seconds = timed(backend.computePlan, image, settings, None, cache)
+        print(f"  {name:7} {seconds:8.3f}s {len(curves):8} curves")
+
+
+def benchRasterize(bed=1000, img=200):
+    """Bed-sized canvas vs. footprint-only rasterization of a placed image"""
+    image = randomBitmap(img * backend.PX_PER_MM, img * backend.PX_PER_MM)
+    settings = dict(backend.DEFAULT_SETTINGS, bed_x=bed, bed_y=bed, img_w=img, img_h=img)
+
+    def legacy(image, settings):
+        new_img = Image.new("RGB", backend.bitmapSize(settings), color=(255, 255, 255))
+        x0, y0, x1, y1 = backend.imageBox(settings)
+        new_img.paste(image.resize((x1 - x0, y1 - y0), Image.Resampling.BICUBIC), (x0, y0))
+        return new_img
+
+    print(f"rasterize: {img}mm image on a {bed}mm bed")
+    for name, bitmap_of in (("bed", legacy), ("footprint", lambda *args: backend.rasterizeImage(*args)[0])):
+        bitmap, seconds = timed(bitmap_of, image, settings)
+        print(f"  {name:9} {seconds:8.3f}s {bitmap.width * bitmap.height * 3 / 1e6:8.1f}MB")
+
+
+def benchSerial(n=300, time_scale=0.002):
+    """Lockstep vs. windowed vs. character-counting streaming into the virtual firmware"""
+    import queue
+    import serial
+    import sender
+    import simulator
+
+    settings = dict(backend.DEFAULT_SETTINGS)
+    toolpath = backend.planToolpath(CurveSet(randomCurves(n)), (1600, 1200), settings)
+    lines = list(backend.generateGcode(toolpath, settings))
+    print(f"serial: {len(lines)} lines, moves at {time_scale}x real time")
+
+    runs = (
+        ("lockstep", "marlin", dict(protocol="window", window=1)),
+        ("window", "marlin", dict(protocol="window", window=4)),
+        ("numbered", "marlin", dict(protocol="window", window=4, line_numbers=True)),
+        ("chars", "grbl", dict(protocol="chars", rx_buffer=127))
+    )
+    for name, flavor, options in runs:
+        firmware = simulator.VirtualFirmware(flavor, time_scale=time_scale)
+        firmware.start()
+        try:
+            with serial.Serial(firmware.port, backend.SERIAL_BAUD_RATE) as port:
+                sender.handshake(port, 5)
+                events = queue.Queue()
+                stream = sender.GcodeSender(port, lines, events, **options)
+                _, seconds = timed(lambda: (stream.start(), stream.join()))
+        finally:
+            firmware.close()
+        print(f"  {name:8} {seconds:8.3f}s {firmware.stats['starved']:8.3f}s starved {firmware.stats['dropped_bytes']:6}B dropped")
+
+
+def benchPreview(n=20000, scale=0.25):
+    """Per-segment bezierToImg vs. batched polylines, full and reduced resolution"""
+    curves = randomCurves(n)
+    settings = dict(backend.DEFAULT_SETTINGS)
+    bitmap_size = (1600, 1200)
+
+    def legacy(curves):
+        img = Image.new("1", bitmap_size, 1)
+        draw = ImageDraw.Draw(img)
+        for p0, c1, c2, p3 in curves:
+            points = [tuple(map(int, bezierPos(t, p0, c1, c2, p3))) for t in numpy.linspace(0, 1, 30)]
+            for i in range(len(points) - 1):
+                draw.line([points[i], points[i + 1]], fill=0, width=8)
+        return img
+
+    _, legacy_time = timed(legacy, curves)
+    _, batch_time = timed(backend.bezierToImg, curves, bitmap_size, settings, None, 1.0)
+    _, reduced_time = timed(backend.bezierToImg, curves, bitmap_size, settings, None, scale)
+
+    print(f"preview: {n} curves")
+    print(f"  legacy  {legacy_time:8.3f}s")
+    print(f"  batched {batch_time:8.3f}s ({legacy_time / batch_time:.0f}x)")
+    print(f"  x{scale:<6} {reduced_time:8.3f}s ({legacy_time / reduced_time:.0f}x)")
+
+
+def benchGcode(n=20000):
+    """Full-precision vs. compact G-code, with and without modal motion"""
+    settings = dict(backend.DEFAULT_SETTINGS)
+    toolpath = backend.planToolpath(CurveSet(randomCurves(n)), (1600, 1200), settings)
+
+    print(f"gcode: {n} curves")
+    defaults = backend.GCODE_COMPACT, backend.GCODE_MODAL_MOTION
+    modes = (("verbose", False, False), ("compact", True, False), ("modal", True, True))
+    for name, compact, modal in modes:
+        backend.GCODE_COMPACT, backend.GCODE_MODAL_MOTION = compact, modal
+        lines, seconds = timed(lambda: list(backend.generateGcode(toolpath, settings)))
+        print(f"  {name:8} {seconds:8.3f}s {len(lines):8} lines {sum(map(len, lines)) + len(lines):10}B")
+    backend.GCODE_COMPACT, backend.GCODE_MODAL_MOTION = defaults
+
+
+def benchSimplify(n=200000):
+    """Flattened points vs. pen-width RDP simplification, with and without dot removal"""
+    settings = dict(backend.DEFAULT_SETTINGS)
+    points, counts = backend.flattenCurves(randomCurves(n, size=200) / 8, backend.FLATTEN_MIN_TOLERANCE) # mm
+    tolerance = settings["pen_thickness"] * backend.SIMPLIFY_TOLERANCE
+
+    print(f"simplify: {n} curves, {len(points)} points, tolerance {tolerance}mm")
+    for name, min_size in (("rdp", 0), ("rdp+dots", settings["pen_thickness"])):
+        (simple, simple_counts), seconds = timed(backend.simplifyStrokes, points, counts, tolerance, min_size)
+        print(f"  {name:8} {seconds:8.3f}s {len(simple):9} points {len(simple_counts):7} strokes")
+
+
+def benchDedup(width=1600, height=1200):
+    """Toolpath of a vtracer trace with and without dropping coincident strokes"""
+    settings = dict(backend.DEFAULT_SETTINGS)
+    settings["img_w"], settings["img_h"] = backend.fitImage(width, height, settings["bed_x"], settings["bed_y"])
+    curves, bitmap_size, _, _ = backend.computePlan(randomBitmap(width, height), settings)
+    tolerance = backend.DEDUP_TOLERANCE
+
+    print(f"dedup: {len(curves)} traced curves")
+    for name, dedup_tolerance in (("off", 0), ("on", tolerance)):
+        backend.DEDUP_TOLERANCE = dedup_tolerance
+        (points, counts), seconds = timed(backend.planToolpath, curves, bitmap_size, settings)
+        drawn = numpy.hypot(*numpy.diff(points, axis=0).T)[numpy.diff(numpy.repeat(numpy.arange(len(counts)), counts)) == 0].sum()
+        print(f"  {name:4} {seconds:8.3f}s {len(counts):6} strokes {drawn:9.0f}mm drawn")
+    backend.DEDUP_TOLERANCE = tolerance
+
+
+def benchHatch(width=1600, height=1200, n=400):
+    """Vectorized hatching of a full bed of traced filled shapes"""
+    rng = numpy.random.default_rng(0)
+    image = Image.new("RGB", (width, height), color=(255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    for x, y, radius in zip(rng.uniform(0, width, n), rng.uniform(0, height, n), rng.uniform(10, 120, n)):
+        draw.ellipse((x, y, x + radius, y + radius * 0.7), fill=(0, 0, 0))
+
+    settings = dict(backend.DEFAULT_SETTINGS)
+    settings.update(bed_x=width // backend.PX_PER_MM, bed_y=height // backend.PX_PER_MM, pen_safety=0.0, pen_thickness=0.3)
+    settings.update(img_w=settings["bed_x"], img_h=settings["bed_y"])
+    bitmap, origin = backend.rasterizeImage(image, settings)
+    curves = tracers.dropFrame(backend.TRACING_FUNC(bitmap), bitmap.size).translate(origin)
+    spacing = settings["pen_thickness"] * backend.HATCH_SPACING * backend.PX_PER_MM
+
+    print(f"hatch: {len(curves)} outline curves, {spacing:.1f}px spacing")
+    for name, angles in (("hatch", (backend.HATCH_ANGLE,)), ("cross", (backend.HATCH_ANGLE, backend.HATCH_ANGLE + 90))):
+        hatches, seconds = timed(lambda: [backend.hatchFill(curves, bitmap, origin, spacing, angle) for angle in angles])
+        segments = sum(len(hatch) for hatch in hatches)
+        strokes = sum(len(numpy.unique(hatch.stroke)) for hatch in hatches)
+        print(f"  {name:6} {seconds:8.3f}s {segments:8} segments {strokes:6} strokes")
+
+
+BENCHMARKS = {
+    "flatten": benchFlatten,
+    "vtracer": benchVTracer,
+    "svgparse": benchSvgParse,
+    "curvememory": benchCurveMemory,
+    "tracecache": benchTraceCache,
+    "rasterize": benchRasterize,
+    "serial": benchSerial,
+    "preview": benchPreview,
+    "gcode": benchGcode,
+    "simplify": benchSimplify,
+    "dedup": benchDedup,
+    "hatch": benchHatch
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
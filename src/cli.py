@@ -0,0 +1,163 @@
+"""Headless planning without the editor window.
+
+    python3 cli.py plan [--config plan.json] [--out DIR] [--jobs N] [--cache-dir DIR] IMAGE_OR_DIR...
+
+The config file is a JSON object with any keys of backend.DEFAULT_SETTINGS,
+flags override it. img_w/img_h default to the editor's auto-fit.
+With --cache-dir, traced curves are kept on disk and repeat artwork skips the tracer.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import functools
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import backend
+import motion
+import vectors
+import tracecache
+
+# Config
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff") + vectors.SVG_EXTENSIONS
+SUMMARY_NAME = "summary.json"
+
+
+def collectImages(paths):
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        else:
+            images.append(path)
+    return images
+
+def readConfig(args):
+    settings = dict(backend.DEFAULT_SETTINGS)
+    settings["img_w"] = settings["img_h"] = None
+
+    if args.config:
+        with open(args.config) as config_file:
+            config = json.load(config_file)
+        unknown = set(config) - set(settings)
+        if unknown:
+            raise SystemExit(f"Unknown config keys: {', '.join(sorted(unknown))}")
+        settings.update(config)
+
+    for key in settings:
+        value = getattr(args, key)
+        if value is not None:
+            settings[key] = value
+
+    return settings
+
+@functools.cache
+def traceCache(directory):
+    """One trace cache per worker process and directory"""
+    return tracecache.TraceCache(backend.TRACE_CACHE_ENTRIES, directory)
+
+def planFile(path, settings, out_dir, cache_dir=None):
+    """Plan one image into out_dir. Runs in a worker process."""
+    timings = {}
+    stage = ["Reading", time.perf_counter()]
+
+    def status(next_stage, fraction=0):
+        if next_stage == stage[0]:
+            return
+        now = time.perf_counter()
+        timings[stage[0]] = now - stage[1]
+        stage[:] = [next_stage, now]
+
+    start_time = time.perf_counter()
+    try:
+        image = vectors.openImage(path)
+        settings = dict(settings)
+        if settings["img_w"] is None or settings["img_h"] is None:
+            settings["img_w"], settings["img_h"] = backend.fitImage(image.width, image.height, settings["bed_x"], settings["bed_y"])
+
+        _, _, toolpath, travel = backend.computePlan(image, settings, status, traceCache(cache_dir))
+
+        status("Writing")
+        out_path = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + ".gcode")
+        with open(out_path, "w") as out_file:
+            backend.writeGcode(backend.generateGcode(toolpath, settings), out_file.write)
+
+        status("Estimating")
+        _, estimate = motion.estimateMotion(backend.generateGcode(toolpath, settings))
+        status(None)
+
+    except Exception as exception:
+        traceback.print_exc()
+        return {"input": path, "error": f"{exception.__class__.__name__}: {exception}"}
+
+    return {
+        "input": path,
+        "output": out_path,
+        "strokes": len(toolpath[1]),
+        "points": len(toolpath[0]),
+        "estimate": estimate,
+        "pen_up_travel": {"before": travel[0], "after": travel[1]},
+        "timings": timings,
+        "total": time.perf_counter() - start_time
+    }
+
+def plan(args):
+    settings = readConfig(args)
+    images = collectImages(args.inputs)
+    if not images:
+        raise SystemExit("No images found.")
+
+    os.makedirs(args.out, exist_ok=True)
+
+    start_time = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(planFile, path, settings, args.out, args.cache_dir) for path in images]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if "error" in result:
+                print(f"FAILED {result['input']}: {result['error']}")
+            else:
+                stages = " ".join(f"{key}={value:.2f}s" for key, value in result["timings"].items())
+                print(f"{result['total']:7.2f}s {result['input']} -> {result['output']} ({stages}, job {backend.seconds_to_string(result['estimate']['total'])}, pen-up {result['pen_up_travel']['before']:.0f} -> {result['pen_up_travel']['after']:.0f}mm)")
+
+    results.sort(key=lambda result: images.index(result["input"]))
+    summary = {
+        "settings": settings,
+        "wall_time": time.perf_counter() - start_time,
+        "results": results
+    }
+    with open(os.path.join(args.out, SUMMARY_NAME), "w") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+
+    failed = sum("error" in result for result in results)
+    print(f"{len(results) - failed}/{len(results)} planned in {summary['wall_time']:.2f}s")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cli.py", description="RasterTrace headless planning")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = commands.add_parser("plan", help="plan images into .gcode files")
+    plan_parser.add_argument("inputs", nargs="+", help="image files or directories")
+    plan_parser.add_argument("--config", help="JSON settings file")
+    plan_parser.add_argument("--out", default="gcode", help="output directory (default: gcode)")
+    plan_parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    plan_parser.add_argument("--cache-dir", default=backend.TRACE_CACHE_DIR, help="keep traced curves in this directory across runs")
+    for key, value in backend.DEFAULT_SETTINGS.items():
+        plan_parser.add_argument(f"--{key.replace('_', '-')}", dest=key, type=type(value))
+
+    args = parser.parse_args(argv)
+    if args.command == "plan":
+        return plan(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
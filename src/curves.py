@@ -0,0 +1,71 @@
+import numpy
+
+
+class CurveSet:
+    """Cubic Bézier curves as one contiguous (N, 4, 2) array plus per-curve metadata.
+    layer: source layer (tracer path/curve index, -1 for synthesized curves)
+    stroke: id shared by curves drawn in one go, unique within the set"""
+
+    def __init__(self, points=None, layer=None, stroke=None, dtype=numpy.float64):
+        if points is None:
+            points = numpy.empty((0, 4, 2))
+        self.points = numpy.ascontiguousarray(numpy.asarray(points, dtype=dtype).reshape(-1, 4, 2))
+
+        curve_n = len(self.points)
+        self.layer = numpy.full(curve_n, -1, dtype=numpy.int32) if layer is None else numpy.asarray(layer, dtype=numpy.int32).reshape(curve_n)
+        self.stroke = numpy.arange(curve_n, dtype=numpy.int32) if stroke is None else numpy.asarray(stroke, dtype=numpy.int32).reshape(curve_n)
+
+    @classmethod
+    def concatenate(cls, curve_sets, dtype=None):
+        """Join sets, stroke ids of later sets are shifted to stay unique"""
+        curve_sets = list(curve_sets)
+        if not curve_sets:
+            return cls(dtype=dtype or numpy.float64)
+
+        stroke_offsets = numpy.cumsum([0] + [int(curve_set.stroke.max()) + 1 if len(curve_set) else 0 for curve_set in curve_sets[:-1]])
+        return cls(
+            numpy.concatenate([curve_set.points for curve_set in curve_sets]),
+            numpy.concatenate([curve_set.layer for curve_set in curve_sets]),
+            numpy.concatenate([curve_set.stroke + offset for curve_set, offset in zip(curve_sets, stroke_offsets)]),
+            dtype or curve_sets[0].points.dtype
+        )
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __getitem__(self, index):
+        """Subset by slice, index array or boolean mask"""
+        return CurveSet(self.points[index], self.layer[index], self.stroke[index], self.points.dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None or dtype == self.points.dtype:
+            return self.points.copy() if copy else self.points
+        return self.points.astype(dtype)
+
+    @property
+    def nbytes(self):
+        return self.points.nbytes + self.layer.nbytes + self.stroke.nbytes
+
+    def astype(self, dtype):
+        return CurveSet(self.points, self.layer, self.stroke, dtype)
+
+    def translate(self, offset):
+        """Copy moved by offset (x, y)"""
+        return CurveSet(self.points + numpy.asarray(offset, dtype=self.points.dtype), self.layer, self.stroke, self.points.dtype)
+
+    def reverse(self, mask):
+        """Flip the direction of the masked curves in place"""
+        self.points[mask] = self.points[mask, ::-1]
+
+
+def bezierSplit(curves):
+    """Split every curve of a (N, 4, 2) array at t=0.5 (de Casteljau)"""
+    p0, c1, c2, p3 = curves[:, 0], curves[:, 1], curves[:, 2], curves[:, 3]
+    p01, p12, p23 = (p0 + c1) / 2, (c1 + c2) / 2, (c2 + p3) / 2
+    p012, p123 = (p01 + p12) / 2, (p12 + p23) / 2
+    mid = (p012 + p123) / 2
+
+    return numpy.stack((p0, p01, p012, mid), axis=1), numpy.stack((mid, p123, p23, p3), axis=1)
@@ -4,6 +4,12 @@ from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
 
 import backend
+import vectors
+
+# Config
+PYRAMID_MIN_SIZE = 256 # px, longer edge of the smallest cached level
+VECTOR_PROXY_SIZE = 2048 # px, longer edge of the raster proxy for SVG artwork
+SETTLE_DELAY = 150 # ms without changes before the image is resampled in full quality
 
 class RasterTraceEditor:
     def __init__(self, root):
@@ -20,7 +26,13 @@ class RasterTraceEditor:
         self.zoom = 1.0
         self.offset_x = self.offset_y = 0
         self.current_image = None
+        self.pyramid = []
         self.image_tk = None
+        self.image_tk_size = None
+        self.image_tk_quality = False
+        self.settle_job = None
+        self.toolpath_tk = None
+        self.toolpath_view = None
         self.img_x = self.img_y = 0
         self.img_w = self.img_h = 100
         self.drag_start = None
@@ -29,17 +41,18 @@ class RasterTraceEditor:
         self.handles = []
         
         # User Config Variables
-        self.bed_x = tk.StringVar(value="200")
-        self.bed_y = tk.StringVar(value="150")
-        self.pen_x = tk.StringVar(value="0")
-        self.pen_y = tk.StringVar(value="0")
-        self.pen_down = tk.StringVar(value="1.0")
-        self.pen_up = tk.StringVar(value="2.0")
-        self.pen_thickness = tk.StringVar(value="1")
-        self.pen_safety = tk.StringVar(value="10")
-        
-        self.bed_x.trace_add("write", lambda *a: (self.draw(), backend._resetPlan()))
-        self.bed_y.trace_add("write", lambda *a: (self.draw(), backend._resetPlan()))
+        defaults = backend.DEFAULT_SETTINGS
+        self.bed_x = tk.StringVar(value=str(defaults["bed_x"]))
+        self.bed_y = tk.StringVar(value=str(defaults["bed_y"]))
+        self.pen_x = tk.StringVar(value=str(defaults["pen_x"]))
+        self.pen_y = tk.StringVar(value=str(defaults["pen_y"]))
+        self.pen_down = tk.StringVar(value=str(defaults["pen_down"]))
+        self.pen_up = tk.StringVar(value=str(defaults["pen_up"]))
+        self.pen_thickness = tk.StringVar(value=str(defaults["pen_thickness"]))
+        self.pen_safety = tk.StringVar(value=str(defaults["pen_safety"]))
+        
+        self.bed_x.trace_add("write", lambda *a: (self.draw(), backend._settingsChanged()))
+        self.bed_y.trace_add("write", lambda *a: (self.draw(), backend._settingsChanged()))
         
         self.setup_ui()
         
@@ -124,8 +137,8 @@ class RasterTraceEditor:
         ttk.Label(bed, text="Y:").pack(side=tk.LEFT)
         ttk.Entry(bed, textvariable=self.bed_y, width=8).pack(side=tk.LEFT, padx=2)
 
-        self.bed_x.trace_add("write", lambda *a: backend._resetPlan())
-        self.bed_y.trace_add("write", lambda *a: backend._resetPlan())
+        self.bed_x.trace_add("write", lambda *a: backend._settingsChanged())
+        self.bed_y.trace_add("write", lambda *a: backend._settingsChanged())
         
         ttk.Label(config, text="Pen Offset (mm):").pack(anchor=tk.W)
         pen_offset = ttk.Frame(config)
@@ -135,8 +148,8 @@ class RasterTraceEditor:
         ttk.Label(pen_offset, text="Y:").pack(side=tk.LEFT)
         ttk.Entry(pen_offset, textvariable=self.pen_y, width=8).pack(side=tk.LEFT, padx=2)
         
-        self.pen_x.trace_add("write", lambda *a: backend._resetPlan())
-        self.pen_y.trace_add("write", lambda *a: backend._resetPlan())
+        self.pen_x.trace_add("write", lambda *a: backend._settingsChanged())
+        self.pen_y.trace_add("write", lambda *a: backend._settingsChanged())
         
         ttk.Label(config, text="Pen Z (mm):").pack(anchor=tk.W)
         pen_z_frame = ttk.Frame(config)
@@ -146,8 +159,8 @@ class RasterTraceEditor:
         ttk.Label(pen_z_frame, text="D:").pack(side=tk.LEFT)
         ttk.Entry(pen_z_frame, textvariable=self.pen_down, width=8).pack(side=tk.LEFT, padx=2)
         
-        self.pen_up.trace_add("write", lambda *a: backend._resetPlan())
-        self.pen_down.trace_add("write", lambda *a: backend._resetPlan())
+        self.pen_up.trace_add("write", lambda *a: backend._settingsChanged())
+        self.pen_down.trace_add("write", lambda *a: backend._settingsChanged())
 
         ttk.Label(config, text="Pen Boundary (mm):").pack(anchor=tk.W)
         pen_boundary_frame = ttk.Frame(config)
@@ -157,8 +170,8 @@ class RasterTraceEditor:
         ttk.Label(pen_boundary_frame, text="S:").pack(side=tk.LEFT)
         ttk.Entry(pen_boundary_frame, textvariable=self.pen_safety, width=8).pack(side=tk.LEFT, padx=2)
         
-        self.pen_thickness.trace_add("write", lambda *a: backend._resetPlan())
-        self.pen_safety.trace_add("write", lambda *a: backend._resetPlan())
+        self.pen_thickness.trace_add("write", lambda *a: backend._settingsChanged())
+        self.pen_safety.trace_add("write", lambda *a: backend._settingsChanged())
 
         # Right Planning
         planning = ttk.LabelFrame(right, text="Planning", padding=10)
@@ -200,6 +213,27 @@ class RasterTraceEditor:
         self.eta_label = ttk.Label(eta_frame, text="-", font=("TkDefaultFont", 9, "bold"),
                                   foreground=backend.FOREGROUND_COLORS["neutral"])
         self.eta_label.pack(side=tk.RIGHT)
+
+        draw_travel_frame = ttk.Frame(status_box)
+        draw_travel_frame.pack(fill=tk.X, pady=1)
+        ttk.Label(draw_travel_frame, text="Draw / Travel:", font=("TkDefaultFont", 9)).pack(side=tk.LEFT)
+        self.draw_travel_label = ttk.Label(draw_travel_frame, text="-", font=("TkDefaultFont", 9, "bold"),
+                                          foreground=backend.FOREGROUND_COLORS["neutral"])
+        self.draw_travel_label.pack(side=tk.RIGHT)
+
+        lifts_frame = ttk.Frame(status_box)
+        lifts_frame.pack(fill=tk.X, pady=1)
+        ttk.Label(lifts_frame, text="Pen Lifts:", font=("TkDefaultFont", 9)).pack(side=tk.LEFT)
+        self.lifts_label = ttk.Label(lifts_frame, text="-", font=("TkDefaultFont", 9, "bold"),
+                                    foreground=backend.FOREGROUND_COLORS["neutral"])
+        self.lifts_label.pack(side=tk.RIGHT)
+
+        travel_frame = ttk.Frame(status_box)
+        travel_frame.pack(fill=tk.X, pady=1)
+        ttk.Label(travel_frame, text="Pen-Up Travel:", font=("TkDefaultFont", 9)).pack(side=tk.LEFT)
+        self.travel_label = ttk.Label(travel_frame, text="-", font=("TkDefaultFont", 9, "bold"),
+                                     foreground=backend.FOREGROUND_COLORS["neutral"])
+        self.travel_label.pack(side=tk.RIGHT)
         
         self.create_plan_btn = ttk.Button(planning, text="Create Plan",
                                          command=backend._createPlanBtn, style="Accent.TButton")
@@ -212,6 +246,10 @@ class RasterTraceEditor:
         self.begin_motion_btn = ttk.Button(planning, text="Begin Motion",
                                          command=backend._beginMotionBtn, style="Accent.TButton")
         self.begin_motion_btn.pack(fill=tk.X)
+
+        self.show_toolpath = tk.BooleanVar(value=True)
+        ttk.Checkbutton(planning, text="Show Toolpath", variable=self.show_toolpath,
+                        command=self.draw).pack(anchor=tk.W, pady=(10, 0))
         
         # Right G-Code Buttons
         ttk.Button(planning, text="Save G-Code",
@@ -227,6 +265,9 @@ class RasterTraceEditor:
             "progress_bar": self.progress,
             "progress_label": self.progress_label,
             "eta_label": self.eta_label,
+            "draw_travel_label": self.draw_travel_label,
+            "lifts_label": self.lifts_label,
+            "travel_label": self.travel_label,
             "create_plan_btn": self.create_plan_btn,
             "connect_serial_btn": self.connect_serial_btn,
             "begin_motion_btn": self.begin_motion_btn,
@@ -258,6 +299,7 @@ class RasterTraceEditor:
         self.draw_bed()
         if self.current_image:
             self.draw_image()
+            self.draw_toolpath()
             self.draw_handles()
 
     
@@ -274,26 +316,21 @@ class RasterTraceEditor:
         self.canvas.create_line(cx, cy-10, cx, cy+10, fill="#999")
         
     def load_image(self):
-        path = filedialog.askopenfilename(filetypes=[("Images", "*.png *.jpg *.jpeg *.gif *.bmp *.tiff")])
+        path = filedialog.askopenfilename(filetypes=[("Images", "*.png *.jpg *.jpeg *.gif *.bmp *.tiff *.svg")])
         
         if path:
             try:
-                self.current_image = Image.open(path)
+                self.current_image = vectors.openImage(path)
+                self.build_pyramid()
                 self.img_x = self.img_y = 0
                 
                 # Auto-size to fit bed
                 bx, by = self.get_bed_size()
-                ratio = self.current_image.width / self.current_image.height
-                if ratio > 1:
-                    self.img_w = min(bx * 0.8, 100)
-                    self.img_h = self.img_w / ratio
-                else:
-                    self.img_h = min(by * 0.8, 100)
-                    self.img_w = self.img_h * ratio
+                self.img_w, self.img_h = backend.fitImage(self.current_image.width, self.current_image.height, bx, by)
                 
                 name = os.path.basename(path)
                 self.img_name.config(text=f"File: {name}")
-                self.img_size.config(text=f"Size: {self.current_image.width}x{self.current_image.height}")
+                self.img_size.config(text=f"Size: {self.current_image.width:g}x{self.current_image.height:g}")
 
                 self.draw()
                 backend._resetPlan()
@@ -303,7 +340,9 @@ class RasterTraceEditor:
     
     def clear_image(self):
         self.current_image = None
+        self.pyramid = []
         self.image_tk = None
+        self.image_tk_size = None
         self.handles = []
         self.img_name.config(text="No image loaded")
         self.img_size.config(text="")
@@ -311,15 +350,83 @@ class RasterTraceEditor:
         self.draw()
         backend._resetPlan()
     
+    def build_pyramid(self):
+        """Halve the image down to PYRAMID_MIN_SIZE once, so redraws resample a close level"""
+        image = self.current_image
+        if isinstance(image, vectors.VectorImage):
+            scale = VECTOR_PROXY_SIZE / max(image.width, image.height)
+            image = image.resize((max(int(image.width * scale), 1), max(int(image.height * scale), 1)))
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+        self.pyramid = [image]
+        while max(self.pyramid[-1].size) >= PYRAMID_MIN_SIZE * 2:
+            self.pyramid.append(self.pyramid[-1].reduce(2))
+        self.image_tk_size = None
+
+    def pyramid_level(self, w, h):
+        """Smallest cached level at least w x h, the full image when enlarging"""
+        for level in reversed(self.pyramid):
+            if level.width >= w and level.height >= h:
+                return level
+        return self.pyramid[0]
+
     def draw_image(self):
         w = int(self.img_w * self.zoom)
         h = int(self.img_h * self.zoom)
         
         if w > 0 and h > 0:
-            img = self.current_image.resize((w, h), Image.Resampling.LANCZOS)
-            self.image_tk = ImageTk.PhotoImage(img)
+            if self.image_tk_size != (w, h):
+                # quick bilinear pass now, LANCZOS once the size settles
+                img = self.pyramid_level(w, h).resize((w, h), Image.Resampling.BILINEAR)
+                self.image_tk = ImageTk.PhotoImage(img)
+                self.image_tk_size = (w, h)
+                self.image_tk_quality = False
+                self.schedule_settle()
             cx, cy = self.to_canvas(self.img_x, self.img_y)
             self.canvas.create_image(cx, cy, image=self.image_tk, anchor=tk.CENTER, tags="image")
+
+    def toolpath_key(self):
+        """What the rendered toolpath overlay depends on: plan, zoom, pan and canvas size"""
+        return (backend.plan_version, self.zoom, self.offset_x, self.offset_y,
+                self.canvas.winfo_width(), self.canvas.winfo_height())
+
+    def draw_toolpath(self):
+        """Planned strokes and pen-up travel over the canvas, rendered as one image once the view settles"""
+        if not self.show_toolpath.get() or not backend.plan_toolpath:
+            return
+
+        if self.toolpath_view == self.toolpath_key():
+            self.canvas.create_image(0, 0, image=self.toolpath_tk, anchor=tk.NW, tags=("toolpath",))
+            self.canvas.tag_raise("handle")
+        else:
+            self.schedule_settle()
+
+    def schedule_settle(self):
+        if self.settle_job:
+            self.root.after_cancel(self.settle_job)
+        self.settle_job = self.root.after(SETTLE_DELAY, self.settle)
+
+    def settle(self):
+        """Full-quality image and a fresh toolpath overlay, once changes have stopped"""
+        self.settle_job = None
+        if not self.current_image:
+            return
+
+        if self.image_tk_size and not self.image_tk_quality:
+            w, h = self.image_tk_size
+            img = self.pyramid_level(w, h).resize((w, h), Image.Resampling.LANCZOS)
+            self.image_tk = ImageTk.PhotoImage(img)
+            self.image_tk_quality = True
+            self.canvas.itemconfig("image", image=self.image_tk)
+
+        if self.show_toolpath.get() and backend.plan_toolpath and self.toolpath_view != self.toolpath_key():
+            w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
+            img = backend.renderToolpath(backend.plan_toolpath, backend.plan_settings, self.to_workspace(0, 0), self.zoom, (w, h))
+            self.toolpath_tk = ImageTk.PhotoImage(img)
+            self.toolpath_view = self.toolpath_key()
+            self.canvas.delete("toolpath")
+            self.draw_toolpath()
     
     def draw_handles(self):
         self.handles = []
@@ -336,7 +443,7 @@ class RasterTraceEditor:
             cx, cy = self.to_canvas(wx, wy)
             h = self.canvas.create_rectangle(cx-6, cy-6, cx+6, cy+6,
                                            fill="#ffffff", outline="#217346", width=2,
-                                           activefill="#f0f8f0", activeoutline="#1a5c37")
+                                           activefill="#f0f8f0", activeoutline="#1a5c37", tags="handle")
             self.handles.append((h, cursor))
     
     def resize_image(self, dx, dy):
@@ -400,7 +507,7 @@ class RasterTraceEditor:
         self.img_w = new_w
         self.img_h = new_h
         self.draw()
-        backend._resetPlan()
+        backend._settingsChanged()
     
     def zoom_in(self):
         w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
@@ -488,12 +595,15 @@ class RasterTraceEditor:
         elif self.drag_mode == "image":
             self.img_x += dx / self.zoom
             self.img_y += dy / self.zoom
-            self.draw()
-            backend._resetPlan()
+            self.canvas.move("image", dx, dy)
+            self.canvas.move("handle", dx, dy)
+            backend._settingsChanged()
         elif self.drag_mode == "workspace":
             self.offset_x += dx
             self.offset_y += dy
-            self.draw()
+            self.canvas.move("all", dx, dy)
+            if backend.plan_toolpath:
+                self.schedule_settle() # render the overlay for the newly visible area
             
         self.drag_start = (e.x, e.y)
     
@@ -508,3 +618,5 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = RasterTraceEditor(root)
     root.mainloop()
+    backend.stopPlan()
+    backend.stopMotion()
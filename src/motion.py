@@ -0,0 +1,141 @@
+import math
+import numpy
+
+# Config
+ACCELERATION = 500 # mm/s² in XY
+Z_ACCELERATION = 100 # mm/s²
+Z_MAX_FEEDRATE = 600 # mm/min
+JUNCTION_DEVIATION = 0.05 # mm, as in GRBL and Marlin's classic jerk replacement
+HOME_TIME = 10 # s assumed for G28
+
+_NONE, _RAPID, _LINEAR, _HOME, _DWELL = range(5)
+
+
+def estimateMotion(lines):
+    """Kinematic time estimate of a G-code program, as the firmware's planner would run it:
+    trapezoidal speed profiles, junction deviation cornering and a slower Z axis.
+    G0 and G1 keep separate modal feedrates, like generateGcode emits them,
+    lines of bare axis words repeat the last motion command (GRBL modal motion).
+    Returns the seconds elapsed after every line (L,) and a summary dict with
+    total, draw (G1) and travel seconds and the number of pen lifts."""
+    kinds, targets, feeds, dwells = _parseLines(lines)
+    line_times = numpy.zeros(len(kinds))
+
+    starts = numpy.vstack((numpy.zeros((1, 3)), targets[:-1]))
+    deltas = targets - starts
+    lengths = numpy.linalg.norm(deltas, axis=1)
+    is_move = ((kinds == _RAPID) | (kinds == _LINEAR)) & (lengths > 0)
+
+    # per move limits, the Z share of a move caps its feedrate and acceleration
+    moves = numpy.flatnonzero(is_move)
+    length = lengths[moves]
+    units = deltas[moves] / length[:, None]
+    z_share = numpy.maximum(numpy.abs(units[:, 2]), 1e-12)
+    xy_share = numpy.maximum(numpy.hypot(units[:, 0], units[:, 1]), 1e-12)
+    speed = numpy.minimum(feeds[moves], Z_MAX_FEEDRATE / 60 / z_share)
+    accel = numpy.minimum(ACCELERATION / xy_share, Z_ACCELERATION / z_share)
+
+    # junction speed with the previous move, zero across homing, dwells and the first move
+    barriers = numpy.cumsum((kinds == _HOME) | (kinds == _DWELL))[moves]
+    junction = numpy.zeros(len(moves))
+    if len(moves) > 1:
+        cos_theta = numpy.clip(-numpy.einsum("nd,nd->n", units[1:], units[:-1]), -1, 1)
+        sin_half = numpy.sqrt((1 - cos_theta) / 2)
+        with numpy.errstate(divide="ignore"):
+            junction[1:] = numpy.sqrt(numpy.minimum(accel[1:], accel[:-1]) * JUNCTION_DEVIATION * sin_half / (1 - sin_half))
+        junction[1:] = numpy.minimum(junction[1:], numpy.minimum(speed[1:], speed[:-1]))
+        junction[1:][barriers[1:] != barriers[:-1]] = 0
+
+    entry, exit = _lookahead(junction.tolist(), (2 * accel * length).tolist())
+    line_times[moves] = _trapezoidTimes(entry, exit, speed, accel, length)
+    line_times[kinds == _HOME] = HOME_TIME
+    line_times[kinds == _DWELL] = dwells[kinds == _DWELL]
+
+    is_draw = kinds == _LINEAR
+    lifts = numpy.zeros(len(kinds), dtype=bool)
+    lifts[1:] = (deltas[1:, 2] > 0) & (kinds[1:] == _RAPID) & (is_draw & is_move)[:-1]
+    summary = {
+        "total": float(line_times.sum()),
+        "draw": float(line_times[is_draw].sum()),
+        "travel": float(line_times[~is_draw].sum()),
+        "lifts": int(lifts.sum())
+    }
+    return numpy.cumsum(line_times), summary
+
+def _parseLines(lines):
+    """Modal G-code state per line: kind, target (L, 3), feedrate in mm/s, dwell seconds"""
+    kinds = []
+    targets = []
+    feeds = []
+    dwells = []
+
+    position = [0.0, 0.0, 0.0]
+    modal_feeds = {_RAPID: 1000 / 60, _LINEAR: 1000 / 60}
+    motion_command = "G0"
+    for line in lines:
+        words = line.split(";", 1)[0].upper().split()
+        kind, dwell = _NONE, 0.0
+        command = words[0] if words else ""
+        if command[:1] in ("X", "Y", "Z", "F"):
+            command = motion_command
+            words.insert(0, command)
+        if command in ("G0", "G00", "G1", "G01"):
+            motion_command = command
+            kind = _RAPID if command in ("G0", "G00") else _LINEAR
+            for word in words[1:]:
+                axis = "XYZ".find(word[0])
+                if axis >= 0:
+                    position[axis] = float(word[1:])
+                elif word[0] == "F":
+                    modal_feeds[kind] = float(word[1:]) / 60
+        elif command == "G28":
+            kind = _HOME
+            position = [0.0, 0.0, 0.0]
+        elif command == "G4":
+            kind = _DWELL
+            for word in words[1:]:
+                if word[0] == "P":
+                    dwell += float(word[1:]) / 1000
+                elif word[0] == "S":
+                    dwell += float(word[1:])
+
+        kinds.append(kind)
+        targets.append(tuple(position))
+        feeds.append(modal_feeds.get(kind, 0))
+        dwells.append(dwell)
+
+    return numpy.array(kinds, dtype=numpy.int8), numpy.array(targets, dtype=numpy.float64).reshape(-1, 3), numpy.array(feeds), numpy.array(dwells)
+
+def _lookahead(junction, reach):
+    """Backward then forward pass over the moves: entry and exit speeds
+    within the junction limits and reachable with each move's acceleration.
+    reach[i] is 2 * accel * length of move i."""
+    move_n = len(junction)
+    entry = junction[:]
+    exit = [0.0] * move_n
+
+    next_entry = 0.0
+    for move_i in range(move_n - 1, -1, -1):
+        exit[move_i] = next_entry
+        entry[move_i] = min(entry[move_i], math.sqrt(next_entry * next_entry + reach[move_i]))
+        next_entry = entry[move_i]
+
+    previous_exit = 0.0
+    for move_i in range(move_n):
+        entry[move_i] = min(entry[move_i], previous_exit) if move_i else 0.0
+        exit[move_i] = min(exit[move_i], math.sqrt(entry[move_i] * entry[move_i] + reach[move_i]))
+        previous_exit = exit[move_i]
+
+    return numpy.array(entry), numpy.array(exit)
+
+def _trapezoidTimes(entry, exit, speed, accel, length):
+    """Duration of each move accelerating from entry towards speed and braking to exit"""
+    entry = numpy.minimum(entry, speed)
+    exit = numpy.minimum(exit, speed)
+    accel_distance = (speed ** 2 - entry ** 2) / (2 * accel)
+    brake_distance = (speed ** 2 - exit ** 2) / (2 * accel)
+    cruise = length - accel_distance - brake_distance
+
+    # too short to reach speed: triangle profile peaking in between
+    peak = numpy.where(cruise >= 0, speed, numpy.sqrt(numpy.maximum((2 * accel * length + entry ** 2 + exit ** 2) / 2, 0)))
+    return (peak - entry) / accel + (peak - exit) / accel + numpy.maximum(cruise, 0) / speed
@@ -0,0 +1,194 @@
+import re
+import time
+import threading
+import itertools
+import collections
+import functools
+import operator
+
+# Config
+READ_TIMEOUT = 0.05 # s, how long one read waits before the send window is refilled
+PROGRESS_INTERVAL = 0.1 # s between progress events
+HANDSHAKE_LINE = "G4 P0" # zero dwell, answered with ok by Marlin and GRBL alike
+HANDSHAKE_RETRY = 1 # s, firmware may still be booting after the port opened
+HANDSHAKE_SETTLE = 0.2 # s to wait for duplicate answers before flushing them
+EMERGENCY_STOP = "M112" # Marlin, queued like any line but handled on arrival
+REALTIME_STOP = b"!\x18" # GRBL feed hold and soft reset, realtime bytes that skip the receive buffer
+HISTORY_LINES = 256 # sent lines kept for resend requests, well beyond what fits into any firmware buffer
+
+_RESEND = re.compile(r"^(?:Resend:|rs)\s*N?(\d+)", re.IGNORECASE)
+
+
+class SenderError(Exception):
+    pass
+
+
+class GcodeSender(threading.Thread):
+    """Streams G-code lines to a serial port from its own thread, keeping the firmware's
+    receive buffer full instead of waiting for every ok.
+    protocol "window": at most window lines unacknowledged (Marlin answers one ok per line),
+    protocol "chars": unacknowledged bytes stay within rx_buffer (GRBL character counting).
+    line_numbers adds N<n> and *<checksum> to every line and follows Resend requests.
+    lines may be any iterable, it is consumed as the firmware takes it and only the last
+    HISTORY_LINES sent lines are kept for resends.
+    Reports ("progress", acknowledged, total), ("done",), ("stopped",) and ("error", message) to events,
+    counting the given lines only, total is passed through (None if unknown)."""
+
+    def __init__(self, port, lines, events, protocol="window", window=4, rx_buffer=128, line_numbers=False, total=None):
+        super().__init__(daemon=True)
+        if protocol not in ("window", "chars"):
+            raise ValueError(f"Unknown protocol {protocol!r}")
+
+        self.port = port
+        self.prefix = ["M110 N0"] if line_numbers else []
+        self.lines = itertools.chain(self.prefix, lines)
+        self.history = collections.deque(maxlen=HISTORY_LINES)
+        self.pulled = 0 # lines taken from self.lines so far
+        self.total = total
+        self.events = events
+        self.protocol = protocol
+        self.window = window
+        self.rx_buffer = rx_buffer
+        self.line_numbers = line_numbers
+        self.stopped = threading.Event()
+        self.emergency = False
+
+    def stop(self, emergency=False):
+        """Stop streaming, emergency also halts the machine (M112, or a soft reset for "chars")"""
+        self.emergency = self.emergency or emergency
+        self.stopped.set()
+
+    def run(self):
+        try:
+            finished = self._stream()
+            if self.emergency:
+                self.port.write(REALTIME_STOP if self.protocol == "chars" else f"{EMERGENCY_STOP}\n".encode())
+            self.events.put(("done",) if finished else ("stopped",))
+        except Exception as exception: # SerialException, OSError, SenderError
+            self.events.put(("error", f"{exception.__class__.__name__}: {exception}"))
+
+    def line(self, line_i):
+        """Line line_i, taken from the iterator or repeated from the history, None past the end"""
+        while self.pulled <= line_i:
+            line = next(self.lines, None)
+            if line is None:
+                return None
+            self.history.append(line)
+            self.pulled += 1
+
+        first_kept = self.pulled - len(self.history)
+        if line_i < first_kept:
+            raise SenderError(f"Resend of line {line_i} requested, only lines from {first_kept} are kept")
+        return self.history[line_i - first_kept]
+
+    def encode(self, line_i):
+        """Bytes on the wire for one line, numbered and checksummed if enabled, None past the end"""
+        line = self.line(line_i)
+        if line is None:
+            return None
+        if self.line_numbers:
+            line = f"N{line_i} {line}"
+            line = f"{line}*{functools.reduce(operator.xor, line.encode(), 0)}"
+        return f"{line}\n".encode()
+
+    def _stream(self):
+        """Send until every line is acknowledged or stop() is called, returns whether finished"""
+        self.port.timeout = READ_TIMEOUT
+        line_n = None # known once the lines ran out
+        prefix_n = len(self.prefix)
+        in_flight = collections.deque() # byte counts of unacknowledged lines, oldest first
+        next_line = 0
+        ignored_resends = 0
+        last_resend = None
+        last_progress = 0
+
+        while not self.stopped.is_set():
+            # fill the window
+            while line_n is None or next_line < line_n:
+                data = self.encode(next_line)
+                if data is None:
+                    line_n = next_line
+                    break
+                if self.protocol == "window" and len(in_flight) >= self.window:
+                    break
+                if self.protocol == "chars" and in_flight and sum(in_flight) + len(data) > self.rx_buffer:
+                    break
+                self.port.write(data)
+                in_flight.append(len(data))
+                next_line += 1
+
+            if next_line == line_n and not in_flight:
+                self.events.put(("progress", line_n - prefix_n, line_n - prefix_n))
+                return True
+
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                self.events.put(("progress", max(next_line - len(in_flight) - prefix_n, 0), self.total))
+
+            response = self.port.readline().decode("ascii", errors="replace").strip()
+            if not response:
+                continue
+
+            resend = _RESEND.match(response)
+            if response.startswith("ok"):
+                if in_flight:
+                    in_flight.popleft()
+            elif resend and self.line_numbers:
+                # lines sent after the bad one ask for the same resend, once each
+                resend_line = int(resend.group(1))
+                if resend_line == last_resend and ignored_resends > 0:
+                    ignored_resends -= 1
+                    continue
+                ignored_resends = max(next_line - resend_line - 1, 0)
+                last_resend = resend_line
+                next_line = min(resend_line, next_line)
+            elif response.lower().startswith("error") and not self.line_numbers:
+                raise SenderError(f"{response} (near line {next_line - len(in_flight) + 1})")
+            # anything else (echo:, busy:, temperatures, numbered-mode errors before a Resend) is informational
+
+        return False
+
+
+class Connector(threading.Thread):
+    """Opens a port with open_port() and waits for the firmware's handshake from its own thread,
+    boards reset when the port opens. Reports ("connected", port), ("invalid",) or ("error", message) to events."""
+
+    def __init__(self, open_port, timeout, events):
+        super().__init__(daemon=True)
+        self.open_port = open_port
+        self.timeout = timeout
+        self.events = events
+
+    def run(self):
+        port = None
+        try:
+            port = self.open_port()
+            if handshake(port, self.timeout):
+                self.events.put(("connected", port))
+            else:
+                port.close()
+                self.events.put(("invalid",))
+        except Exception as exception: # SerialException, OSError
+            if port is not None:
+                port.close()
+            self.events.put(("error", f"{exception.__class__.__name__}: {exception}"))
+
+
+def handshake(port, timeout):
+    """Wait for the firmware to answer HANDSHAKE_LINE with ok, returns whether it did"""
+    deadline = time.perf_counter() + timeout
+    port.timeout = READ_TIMEOUT
+    last_try = 0
+
+    while time.perf_counter() < deadline:
+        if time.perf_counter() - last_try >= HANDSHAKE_RETRY:
+            port.write(f"{HANDSHAKE_LINE}\n".encode())
+            last_try = time.perf_counter()
+
+        if port.readline().decode("ascii", errors="replace").strip().startswith("ok"):
+            time.sleep(HANDSHAKE_SETTLE)
+            port.reset_input_buffer()
+            return True
+
+    return False
@@ -0,0 +1,288 @@
+"""Virtual plotter firmware on a pseudo-terminal, for testing serial streaming without a machine.
+
+    python3 simulator.py [--flavor marlin|grbl] [--rx-buffer BYTES] [--planner-depth MOVES]
+                         [--time-scale FACTOR] [--error-rate P] [--baud RATE] [--latency SECONDS]
+
+Prints the device path to put into backend.SERIAL_PORT and runs until interrupted.
+"""
+import os
+import re
+import pty
+import tty
+import math
+import time
+import random
+import select
+import argparse
+import threading
+import functools
+import operator
+import collections
+
+# Config
+DEFAULT_FEEDRATE = 1000 # mm/min until the first F word
+HOME_TIME = 2 # s for G28
+IDLE_POLL = 0.05 # s
+BAUD_RATE = 115200
+LINK_LATENCY = 0.002 # s until a reply starts on the wire, USB serial adapters poll every 1-16 ms
+BITS_PER_BYTE = 10 # 8N1 with start and stop bit
+
+_WORD = re.compile(r"([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+_NUMBERED = re.compile(r"^N(\d+)\s*(.*?)\s*(?:\*(\d+))?$")
+_GRBL_REALTIME = re.compile(rb"[!~\x18]") # feed hold, cycle start, soft reset
+_GRBL_BANNER = "Grbl 1.1h ['$' for help]"
+
+
+class VirtualFirmware(threading.Thread):
+    """Marlin or GRBL lookalike behind a pseudo-terminal, connect to self.port like a real device.
+    Incoming bytes beyond rx_buffer are dropped, like an unbuffered UART. A line leaves the
+    receive buffer (and is answered with ok) once the planner has room for it, planned moves
+    take their distance / feedrate times time_scale. error_rate is the chance for every line
+    to arrive corrupted: checksum errors and Resend for numbered Marlin lines, error responses otherwise.
+    GRBL takes feed hold (!), cycle start (~) and soft reset (0x18) as realtime bytes on arrival and
+    rejects M112, Marlin halts on M112. The link runs at baud in both directions, bytes take BITS_PER_BYTE / baud each in real time,
+    and replies start latency seconds after they are sent.
+    stats counts lines, moves, dropped bytes, resends and starved seconds (planner ran empty mid-job)."""
+
+    def __init__(self, flavor="marlin", rx_buffer=128, planner_depth=16, time_scale=1.0, error_rate=0.0, seed=0,
+                 baud=BAUD_RATE, latency=LINK_LATENCY):
+        super().__init__(daemon=True)
+        if flavor not in ("marlin", "grbl"):
+            raise ValueError(f"Unknown flavor {flavor!r}")
+
+        self.flavor = flavor
+        self.rx_buffer = rx_buffer
+        self.planner_depth = planner_depth
+        self.time_scale = time_scale
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.byte_time = BITS_PER_BYTE / baud
+        self.latency = latency
+
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+        self.closed = threading.Event()
+        self.halted = False
+        self.stats = {"lines": 0, "moves": 0, "dropped_bytes": 0, "errors": 0, "resends": 0, "starved": 0.0}
+
+        self._rx = bytearray()
+        self._wire = bytearray() # written by the host, not yet arrived
+        self._wire_start = 0.0 # time the first byte on the wire started
+        self._replies = collections.deque() # (arrival time, bytes) of replies on their way to the host
+        self._reply_end = 0.0
+        self._planner = collections.deque() # durations of planned moves, the head is executing
+        self._move_end = None
+        self._starved_since = None
+        self._position = [0.0, 0.0, 0.0]
+        self._feedrate = DEFAULT_FEEDRATE
+        self._motion = "G0"
+        self._last_line = 0
+        self._held_since = None
+
+    def close(self):
+        self.closed.set()
+        if self.is_alive():
+            self.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def run(self):
+        if self.flavor == "grbl":
+            self._respond(_GRBL_BANNER)
+        else:
+            self._respond("start")
+
+        while not self.closed.is_set():
+            now = time.perf_counter()
+            self._execute(now)
+            self._transfer(now)
+            self._parse()
+
+            wake = now + IDLE_POLL
+            if self._move_end is not None and self._held_since is None:
+                wake = min(wake, self._move_end)
+            if self._wire:
+                # lines are only parsed once complete
+                line_end = self._wire.find(b"\n")
+                wake = min(wake, self._wire_start + ((line_end if line_end >= 0 else len(self._wire) - 1) + 1) * self.byte_time)
+            if self._replies:
+                wake = min(wake, self._replies[0][0])
+            readable, _, _ = select.select([self._master], [], [], max(wake - time.perf_counter(), 0))
+            if readable:
+                if not self._wire:
+                    self._wire_start = time.perf_counter()
+                self._wire += os.read(self._master, 4096)
+
+    def _transfer(self, now):
+        """Deliver the bytes and replies whose time on the wire is over"""
+        if self._wire:
+            arrived = min(int((now - self._wire_start) / self.byte_time), len(self._wire))
+            if arrived > 0:
+                self._receive(bytes(self._wire[:arrived]), now)
+                del self._wire[:arrived]
+                self._wire_start += arrived * self.byte_time
+        while self._replies and self._replies[0][0] <= now:
+            os.write(self._master, self._replies.popleft()[1])
+
+    def _receive(self, data, now):
+        if self.flavor == "grbl" and _GRBL_REALTIME.search(data):
+            for byte in _GRBL_REALTIME.findall(data):
+                self._realtime(byte, now)
+            data = _GRBL_REALTIME.sub(b"", data)
+        room = self.rx_buffer - len(self._rx)
+        if len(data) > room:
+            self.stats["dropped_bytes"] += len(data) - room
+        self._rx += data[:max(room, 0)]
+
+    def _realtime(self, byte, now):
+        if byte == b"!" and self._held_since is None:
+            self._held_since = now
+        elif byte == b"~" and self._held_since is not None:
+            if self._move_end is not None:
+                self._move_end += now - self._held_since
+            self._held_since = None
+        elif byte == b"\x18":
+            # soft reset drops everything queued, after a reset in motion GRBL stays locked in alarm
+            if self._planner:
+                self.halted = True
+                self._respond("ALARM:3")
+            self._planner.clear()
+            self._move_end = None
+            self._starved_since = None
+            self._held_since = None
+            self._rx.clear()
+            self._respond(_GRBL_BANNER)
+
+    def _execute(self, now):
+        """Finish planned moves whose time is up"""
+        if self._held_since is not None:
+            return
+        while self._move_end is not None and now >= self._move_end:
+            self._planner.popleft()
+            if self._planner:
+                self._move_end += self._planner[0]
+            else:
+                self._move_end = None
+                self._starved_since = now
+
+    def _plan(self, duration):
+        if duration <= 0:
+            return
+        now = time.perf_counter()
+        if not self._planner:
+            if self._starved_since is not None and self.stats["moves"]:
+                self.stats["starved"] += now - self._starved_since
+            self._starved_since = None
+            self._move_end = now + duration
+        self._planner.append(duration)
+        self.stats["moves"] += 1
+
+    def _parse(self):
+        """Take complete lines from the receive buffer while the planner has room"""
+        while not self.halted and len(self._planner) < self.planner_depth:
+            line_end = self._rx.find(b"\n")
+            if line_end < 0:
+                return
+            line = self._rx[:line_end].decode("ascii", errors="replace").strip()
+            del self._rx[:line_end + 1]
+            if line:
+                self.stats["lines"] += 1
+                self._command(line)
+            elif self.flavor == "grbl":
+                self._respond("ok")
+
+    def _command(self, line):
+        corrupted = self.error_rate and self.random.random() < self.error_rate
+
+        numbered = _NUMBERED.match(line) if self.flavor == "marlin" else None
+        if numbered:
+            number, line, checksum = int(numbered.group(1)), numbered.group(2), numbered.group(3)
+            body = f"N{numbered.group(1)} {line}"
+            if corrupted or checksum is None or int(checksum) != functools.reduce(operator.xor, body.encode(), 0):
+                self._resend("checksum mismatch")
+                return
+            if number != self._last_line + 1 and not line.startswith("M110"):
+                self._resend("Line Number is not Last Line Number+1")
+                return
+            self._last_line = number
+        elif corrupted:
+            self.stats["errors"] += 1
+            self._respond("error:1" if self.flavor == "grbl" else "Error:Unknown command")
+            return
+
+        words = {letter: float(value) for letter, value in _WORD.findall(line.upper())}
+        command = line.split()[0].upper() if line.split() else ""
+        if self.flavor == "grbl" and command[:1] in ("X", "Y", "Z", "F"):
+            command = self._motion # modal motion, Marlin ignores such lines
+        if command == "M112" and self.flavor == "grbl":
+            self.stats["errors"] += 1
+            self._respond("error:20") # unsupported command
+            return
+        if command == "M112":
+            self.halted = True
+            self._respond("Error:Printer halted. kill() called!")
+            return
+        if command == "M110":
+            self._last_line = int(words.get("N", 0))
+        elif command in ("G0", "G1", "G00", "G01"):
+            self._motion = command
+            self._move(words)
+        elif command == "G28":
+            self._position = [0.0, 0.0, 0.0]
+            self._plan(HOME_TIME * self.time_scale)
+        elif command == "G4":
+            seconds = words.get("P", 0) / (1000 if self.flavor == "marlin" else 1) + words.get("S", 0)
+            self._plan(seconds * self.time_scale)
+        self._respond("ok")
+
+    def _move(self, words):
+        if "F" in words:
+            self._feedrate = max(words["F"], 1)
+        target = [words.get(axis, position) for axis, position in zip("XYZ", self._position)]
+        distance = math.dist(target, self._position)
+        self._position = target
+        if distance > 0:
+            self._plan(distance / self._feedrate * 60 * self.time_scale)
+
+    def _resend(self, reason):
+        self.stats["resends"] += 1
+        self._respond(f"Error:{reason}, Last Line: {self._last_line}")
+        self._respond(f"Resend: {self._last_line + 1}")
+        self._respond("ok")
+
+    def _respond(self, text):
+        data = f"{text}\n".encode()
+        start = max(time.perf_counter() + self.latency, self._reply_end)
+        self._reply_end = start + len(data) * self.byte_time
+        self._replies.append((self._reply_end, data))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Virtual plotter firmware on a pseudo-terminal")
+    parser.add_argument("--flavor", choices=("marlin", "grbl"), default="marlin")
+    parser.add_argument("--rx-buffer", type=int, default=128, help="receive buffer in bytes (default: 128)")
+    parser.add_argument("--planner-depth", type=int, default=16, help="planned moves (default: 16)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="move time factor, < 1 runs faster than real time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="chance for a line to arrive corrupted")
+    parser.add_argument("--baud", type=int, default=BAUD_RATE, help=f"link speed (default: {BAUD_RATE})")
+    parser.add_argument("--latency", type=float, default=LINK_LATENCY, help=f"reply latency in s (default: {LINK_LATENCY})")
+    args = parser.parse_args(argv)
+
+    firmware = VirtualFirmware(args.flavor, args.rx_buffer, args.planner_depth, args.time_scale, args.error_rate,
+                               baud=args.baud, latency=args.latency)
+    firmware.start()
+    print(f"Virtual {args.flavor} on {firmware.port}, Ctrl+C to stop")
+    try:
+        while firmware.is_alive():
+            firmware.join(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        firmware.close()
+        print(firmware.stats)
+
+
+if __name__ == "__main__":
+    main()
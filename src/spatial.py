@@ -0,0 +1,161 @@
+import math
+import numpy
+
+
+class PointGrid:
+    """Hashed uniform grid over 2D points for radius and nearest-neighbour lookups"""
+
+    def __init__(self, points, cell_size, ids=None):
+        self.points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+        self.ids = numpy.arange(len(self.points)) if ids is None else numpy.asarray(ids)
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.bounds = (0, 0, -1, -1)
+
+        if len(self.points) == 0:
+            return
+
+        cells = numpy.floor(self.points / self.cell_size).astype(numpy.int64)
+        self.bounds = (*cells.min(axis=0).tolist(), *cells.max(axis=0).tolist())
+
+        order = numpy.lexsort((cells[:, 1], cells[:, 0]))
+        sorted_cells = cells[order]
+        splits = numpy.flatnonzero(numpy.any(sorted_cells[1:] != sorted_cells[:-1], axis=1)) + 1
+        cell_keys = sorted_cells[numpy.concatenate(([0], splits))].tolist()
+        for cell, members in zip(cell_keys, numpy.split(order, splits)):
+            self.cells[tuple(cell)] = members
+
+    def __len__(self):
+        return len(self.points)
+
+    def nearest(self, x, y, k=1, radius=math.inf, alive=None, max_rings=None):
+        """Up to k ids closest to (x, y) and within radius, closest first.
+        alive is an optional boolean mask indexed by id, dead ids are skipped.
+        Returns (ids, distances). An empty result after max_rings rings only
+        means nothing was found that close, not that the grid is empty."""
+        min_x, min_y, max_x, max_y = self.bounds
+        cx = math.floor(x / self.cell_size)
+        cy = math.floor(y / self.cell_size)
+
+        # rings entirely outside the occupied cells can be skipped
+        first_ring = max(min_x - cx, cx - max_x, min_y - cy, cy - max_y, 0)
+        last_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)
+        if max_rings is not None:
+            last_ring = min(last_ring, first_ring + max_rings)
+
+        found = []
+        result = (numpy.empty(0, dtype=self.ids.dtype), numpy.empty(0))
+        for ring in range(first_ring, last_ring + 1):
+            new_members = False
+            for cell in self._ringCells(cx, cy, ring):
+                members = self.cells.get(cell)
+                if members is not None:
+                    found.append(members)
+                    new_members = True
+
+            # everything closer than ring * cell_size has been visited
+            covered = ring * self.cell_size
+            if new_members:
+                result = self._select(numpy.concatenate(found), x, y, k, radius, alive)
+                if len(result[0]) == k and result[1][-1] <= covered:
+                    break
+            if covered >= radius:
+                break
+
+        return result
+
+    def within(self, x, y, radius):
+        """All ids within radius of (x, y), unordered"""
+        x0, y0 = math.floor((x - radius) / self.cell_size), math.floor((y - radius) / self.cell_size)
+        x1, y1 = math.floor((x + radius) / self.cell_size), math.floor((y + radius) / self.cell_size)
+
+        found = [
+            self.cells[(cell_x, cell_y)]
+            for cell_x in range(max(x0, self.bounds[0]), min(x1, self.bounds[2]) + 1)
+            for cell_y in range(max(y0, self.bounds[1]), min(y1, self.bounds[3]) + 1)
+            if (cell_x, cell_y) in self.cells
+        ]
+        if not found:
+            return numpy.empty(0, dtype=self.ids.dtype)
+
+        members = numpy.concatenate(found)
+        offsets = self.points[members] - (x, y)
+        return self.ids[members[numpy.einsum("nd,nd->n", offsets, offsets) <= radius * radius]]
+
+    def _ringCells(self, cx, cy, ring):
+        min_x, min_y, max_x, max_y = self.bounds
+        if ring == 0:
+            return [(cx, cy)]
+
+        x_range = range(max(cx - ring, min_x), min(cx + ring, max_x) + 1)
+        y_range = range(max(cy - ring + 1, min_y), min(cy + ring - 1, max_y) + 1)
+
+        cells = []
+        for row in (cy - ring, cy + ring):
+            if min_y <= row <= max_y:
+                cells.extend((cell_x, row) for cell_x in x_range)
+        for column in (cx - ring, cx + ring):
+            if min_x <= column <= max_x:
+                cells.extend((column, cell_y) for cell_y in y_range)
+        return cells
+
+    def _select(self, members, x, y, k, radius, alive):
+        ids = self.ids[members]
+        points = self.points[members]
+        if alive is not None:
+            mask = alive[ids]
+            ids, points = ids[mask], points[mask]
+
+        distances = numpy.hypot(points[:, 0] - x, points[:, 1] - y)
+        mask = distances <= radius
+        ids, distances = ids[mask], distances[mask]
+
+        order = numpy.argsort(distances)[:k]
+        return ids[order], distances[order]
+
+
+def cellSize(points, per_cell=2):
+    """Cell edge length that puts roughly per_cell points into each occupied cell"""
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+    if len(points) < 2:
+        return 1.0
+
+    extent = numpy.ptp(points, axis=0)
+    # the second term keeps (nearly) collinear point sets from collapsing the cells
+    return max(
+        math.sqrt(extent[0] * extent[1] * per_cell / len(points)),
+        extent.max() * per_cell / len(points),
+        1e-6
+    )
+
+def lowerNeighbours(points, owners, radius, chunk=1 << 18):
+    """Whether each point has a point of a lower owner within radius.
+    Vectorized join of a uniform grid with its 3x3 neighbourhoods, chunk points at a time."""
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+    found = numpy.zeros(len(points), dtype=bool)
+    if len(points) == 0:
+        return found
+
+    cells = numpy.floor(points / radius).astype(numpy.int64)
+    cells -= cells.min(axis=0) - 1 # one empty row and column around, neighbour keys never wrap
+    height = cells[:, 1].max() + 2
+    keys = cells[:, 0] * height + cells[:, 1]
+    order = numpy.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    for chunk_start in range(0, len(points), chunk):
+        query = numpy.arange(chunk_start, min(chunk_start + chunk, len(points)))
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                neighbour_keys = keys[query] + dx * height + dy
+                low = numpy.searchsorted(sorted_keys, neighbour_keys, "left")
+                member_n = numpy.searchsorted(sorted_keys, neighbour_keys, "right") - low
+                pair_query = numpy.repeat(query, member_n)
+                pair_offsets = numpy.arange(member_n.sum()) - numpy.repeat(numpy.cumsum(member_n) - member_n, member_n)
+                pair_member = order[numpy.repeat(low, member_n) + pair_offsets]
+
+                delta = points[pair_member] - points[pair_query]
+                hit = (owners[pair_member] < owners[pair_query]) & (numpy.einsum("nd,nd->n", delta, delta) <= radius * radius)
+                found[pair_query[hit]] = True
+
+    return found
@@ -0,0 +1,93 @@
+import os
+import hashlib
+import tempfile
+import collections
+import numpy
+
+from curves import CurveSet
+
+# Config
+CACHE_VERSION = 2 # bump when the stored format or tracer output changes
+
+
+class TraceCache:
+    """Traced curves by content key, LRU in memory and optionally persisted to a directory"""
+
+    def __init__(self, max_entries, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory and os.path.expanduser(directory)
+        self.entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Cached CurveSet for key or None, falls back to the directory"""
+        curves = self.entries.get(key)
+        if curves is not None:
+            self.entries.move_to_end(key)
+            return curves
+
+        curves = self._load(key)
+        if curves is not None:
+            self._remember(key, curves)
+        return curves
+
+    def put(self, key, curves):
+        self._remember(key, curves)
+        self._store(key, curves)
+
+    def subset(self, keys):
+        """Cache on the same directory holding only the given keys' memory entries.
+        Cheap to hand to a planning process, update() merges it back."""
+        other = TraceCache(self.max_entries, self.directory)
+        for key in keys:
+            if key in self.entries:
+                other.entries[key] = self.entries[key]
+        return other
+
+    def update(self, other):
+        """Take over the memory entries of another cache, without writing them again"""
+        for key, curves in other.entries.items():
+            self._remember(key, curves)
+
+    def _remember(self, key, curves):
+        self.entries[key] = curves
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        try:
+            with numpy.load(self._path(key)) as data:
+                return CurveSet(data["points"], data["layer"], data["stroke"], data["points"].dtype)
+        except (OSError, KeyError, ValueError):
+            return None # missing or unreadable, retrace
+
+    def _store(self, key, curves):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+
+        # write aside and rename, concurrent planners never see half a file
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                numpy.savez(tmp_file, points=curves.points, layer=curves.layer, stroke=curves.stroke)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def cacheKey(image, *params):
+    """Hex digest over the decoded image pixels and any repr-able parameters"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(repr((CACHE_VERSION, image.mode, image.size, params)).encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
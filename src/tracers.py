@@ -1,10 +1,21 @@
+import io
+import re
+import sys
+import math
+import time
+import signal
+import threading
+import multiprocessing
 import numpy
 from xml.etree import cElementTree
 from PIL import ImageOps
 
 import potrace
 import vtracer
-import svg.path as svgpath
+
+import spatial
+import vectors
+from curves import CurveSet, bezierSplit
 
 
 # Config
@@ -15,8 +26,26 @@ VTRACER_FILTER_SPECKLE = 4
 VTRACER_COLOR_PRECISION = 8
 VTRACER_LAYER_DIFFERENCE = 10
 VTRACER_PATH_PRECISION = 8
+CURVE_DTYPE = numpy.float64 # numpy.float32 halves curve memory
+TILE_WORKERS = None # None: all cores
+TILE_STITCH_TOLERANCE = 16 # px
+TILE_SPLIT_LENGTH = 1 # px, curves crossing a tile's core edge are halved down to this
+TILE_SPLIT_DEPTH = 12
+MINIMIZE_TIME_BUDGET = 10 # seconds, at most
+MINIMIZE_MIN_GAIN = 0.001 # fraction of pen-up travel an improvement pass must save to run another one
+MINIMIZE_NEIGHBOURS = 8
+MINIMIZE_MAX_RINGS = 16
+TRACE_PARAMS = ( # the constants above that change traced curves, keyed by backend.traceKey
+    "POTRACE_IMG_THRESHOLD", "POTRACE_INVERT",
+    "VTRACER_INVERT", "VTRACER_FILTER_SPECKLE", "VTRACER_COLOR_PRECISION", "VTRACER_LAYER_DIFFERENCE", "VTRACER_PATH_PRECISION",
+    "CURVE_DTYPE", "TILE_STITCH_TOLERANCE", "TILE_SPLIT_LENGTH", "TILE_SPLIT_DEPTH"
+)
+
+_SVG_COMMANDS = re.compile("[MmLlHhVvCcSsQqTtAaZz]")
+_SVG_FAST_ARITY = {"M": 2, "L": 2, "C": 6, "Z": 0}
+
 
-def tracePotracer(img):
+def tracePotracer(img, progress=None):
     """Classic but less reliable"""
 
     new_img = img.convert("L").point(lambda x: 255 if x < POTRACE_IMG_THRESHOLD else 0, mode="1")
@@ -28,15 +57,20 @@ def tracePotracer(img):
     trace = bitmap.trace()
 
     bezier_curves = []
+    curve_layers = []
     
-    for curve in trace:
-        prev_point = _ptPoint_to_numpy(curve.start_point)
+    for curve_i, curve in enumerate(trace):
+        if progress:
+            progress(curve_i / len(trace))
+
+        prev_point = _ptPoint_to_tuple(curve.start_point)
+        segment_n = len(bezier_curves)
         
         for segment in curve.segments:
-            end_point = _ptPoint_to_numpy(segment.end_point)
+            end_point = _ptPoint_to_tuple(segment.end_point)
             if segment.is_corner:
                 # CornerSegment: force sharp turn
-                c = _ptPoint_to_numpy(segment.c)
+                c = _ptPoint_to_tuple(segment.c)
 
                 bezier_curves.append([
                     prev_point, prev_point, c, c
@@ -48,8 +82,8 @@ def tracePotracer(img):
                 ])
             else:
                 # BezierSegment: direct conversion
-                c1 = _ptPoint_to_numpy(segment.c1)
-                c2 = _ptPoint_to_numpy(segment.c2)
+                c1 = _ptPoint_to_tuple(segment.c1)
+                c2 = _ptPoint_to_tuple(segment.c2)
 
                 bezier_curves.append([
                     prev_point,
@@ -59,23 +93,27 @@ def tracePotracer(img):
                 ])
             
             prev_point = end_point
+
+        curve_layers.extend([curve_i] * (len(bezier_curves) - segment_n))
     
-    return bezier_curves
+    # every potrace curve is one closed stroke
+    return CurveSet(bezier_curves, curve_layers, curve_layers, CURVE_DTYPE)
 
-def traceVTracer(img):
+def traceVTracer(img, progress=None):
     """"""
 
     new_img = img.convert("L")
 
     if VTRACER_INVERT:
         new_img = ImageOps.invert(new_img)
-    
-    new_img = new_img.convert("RGBA")
 
-    pixels: list[tuple[int, int, int, int]] = list(new_img.getdata())
-    svg = vtracer.convert_pixels_to_svg(
-        rgba_pixels=pixels,
-        size=new_img.size,
+    # hand vtracer one uncompressed buffer instead of a tuple per pixel
+    img_buffer = io.BytesIO()
+    new_img.save(img_buffer, format="BMP")
+
+    svg = vtracer.convert_raw_image_to_svg(
+        img_buffer.getvalue(),
+        img_format="bmp",
         colormode="color",
         hierarchical="cutout",
         mode="spline",
@@ -87,48 +125,433 @@ def traceVTracer(img):
         layer_difference=VTRACER_LAYER_DIFFERENCE,
         path_precision=VTRACER_PATH_PRECISION
     )
+    return parseVTracerSvg(svg, progress)
+
+def parseVTracerSvg(svg, progress=None):
+    """vtracer SVG -> CurveSet of cubic curves, translations applied.
+    Each <path> is a layer, each of its subpaths a stroke.
+    Lines and closing segments become straight cubics. Paths that use anything
+    beyond absolute M/L/C/Z commands fall back to svg.path."""
     xml_svg = cElementTree.fromstring(svg)
+    paths = [element for element in xml_svg if element.tag.endswith("path")]
 
-    bezier_curves = []
-    for element in xml_svg:
-        if not element.tag.endswith("path"):
-            continue
+    letters = []
+    layers = []
+    numbers = []
+    translations = []
+    fallback_curves = []
+    for path_i, element in enumerate(paths):
+        if progress:
+            progress(path_i / len(paths))
 
         path_d = element.get("d")
         path_tf = _vtTransform_to_numpy(element.get("transform"))
-        path_fill = element.get("fill")
 
-        svg_path = svgpath.parse_path(path_d)
-        for segment in svg_path:
-            if type(segment) != svgpath.CubicBezier:
-                continue
+        path_letters = _SVG_COMMANDS.findall(path_d)
+        try:
+            path_numbers = numpy.fromstring(_SVG_COMMANDS.sub(" ", path_d).replace(",", " "), sep=" ")
+        except ValueError:
+            path_numbers = None
+
+        if (
+            path_numbers is None or
+            not path_letters or path_letters[0] != "M" or
+            not _SVG_FAST_ARITY.keys() >= set(path_letters) or
+            sum(_SVG_FAST_ARITY[letter] for letter in path_letters) != len(path_numbers)
+        ):
+            fallback_points = vectors.parsePath(path_d) + path_tf
+            fallback_curves.append(CurveSet(fallback_points, numpy.full(len(fallback_points), path_i), None, CURVE_DTYPE))
+            continue
+
+        letters.append("".join(path_letters))
+        layers.append(numpy.full(len(path_letters), path_i))
+        numbers.append(path_numbers)
+        translations.append(numpy.broadcast_to(path_tf, (len(path_letters), 2)))
+
+    if not letters:
+        return CurveSet.concatenate(fallback_curves, CURVE_DTYPE)
+
+    codes = numpy.frombuffer("".join(letters).encode(), dtype=numpy.uint8)
+    numbers = numpy.concatenate(numbers)
+    translations = numpy.concatenate(translations)
+    is_move = codes == ord("M")
+    is_cubic = codes == ord("C")
+    is_close = codes == ord("Z")
+
+    arity = numpy.select((is_cubic, is_close), (6, 0), 2)
+    first_number = numpy.cumsum(arity) - arity
+
+    # every command's end point, Z returns to the latest M
+    end_points = numpy.empty((len(codes), 2))
+    has_end = ~is_close
+    end_number = (first_number + numpy.maximum(arity - 2, 0))[has_end]
+    end_points[has_end] = numpy.stack((numbers[end_number], numbers[end_number + 1]), axis=1) + translations[has_end]
+    latest_move = numpy.maximum.accumulate(numpy.where(is_move, numpy.arange(len(codes)), 0))
+    end_points[is_close] = end_points[latest_move[is_close]]
 
-            bezier_curves.append([
-                _spPoint_to_numpy(segment.start) + path_tf,
-                _spPoint_to_numpy(segment.control1) + path_tf,
-                _spPoint_to_numpy(segment.control2) + path_tf,
-                _spPoint_to_numpy(segment.end) + path_tf
-            ])
-        # print(svg_path) # TODO don't forget to offset with path_tf
+    start_points = numpy.roll(end_points, 1, axis=0)
+    chords = end_points - start_points
 
+    # straight segments with their controls on the chord thirds
+    curves = numpy.stack((start_points, start_points + chords / 3, end_points - chords / 3, end_points), axis=1)
+    control_number = first_number[is_cubic]
+    curves[is_cubic, 1] = numpy.stack((numbers[control_number], numbers[control_number + 1]), axis=1) + translations[is_cubic]
+    curves[is_cubic, 2] = numpy.stack((numbers[control_number + 2], numbers[control_number + 3]), axis=1) + translations[is_cubic]
 
-    return bezier_curves
+    is_segment = ~is_move & ~(is_close & numpy.all(chords == 0, axis=1))
+    subpaths = numpy.cumsum(is_move) - 1
+    parsed = CurveSet(curves[is_segment], numpy.concatenate(layers)[is_segment], subpaths[is_segment], CURVE_DTYPE)
+    return CurveSet.concatenate([parsed] + fallback_curves, CURVE_DTYPE)
 
+def dropFrame(curves, size):
+    """Drop curves running along the outer edge of a bitmap of size (width, height),
+    the outline tracers give the white background around everything else"""
+    points = curves.points
+    width, height = size
+    on_edge = (
+        numpy.all(points[:, :, 0] <= 0, axis=1) | numpy.all(points[:, :, 0] >= width, axis=1) |
+        numpy.all(points[:, :, 1] <= 0, axis=1) | numpy.all(points[:, :, 1] >= height, axis=1)
+    )
+    return curves[~on_edge]
+
+
+def traceTiled(img, trace_func, tile_size, overlap, progress=None):
+    """Trace overlapping tiles in a process pool and stitch the curves across seams.
+    Every tile cuts its curves at the edge of its own (non-overlapping) core and keeps
+    what lies inside, then the pieces cut open at a seam are joined with the
+    neighbouring tiles' pieces into continuous strokes."""
+    width, height = img.size
+
+    jobs = []
+    for top in range(0, height, tile_size):
+        for left in range(0, width, tile_size):
+            core = (left, top, min(left + tile_size, width), min(top + tile_size, height))
+            box = (max(left - overlap, 0), max(top - overlap, 0), min(core[2] + overlap, width), min(core[3] + overlap, height))
+            jobs.append((trace_func, img.crop(box), box[:2], core))
+
+    if len(jobs) == 1:
+        return trace_func(img, progress=progress)
+
+    # let a terminated planning process take its pool down with it
+    in_main_thread = threading.current_thread() is threading.main_thread()
+    if in_main_thread:
+        previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+
+    try:
+        results = [None] * len(jobs)
+        with multiprocessing.Pool(TILE_WORKERS) as pool:
+            for done_n, (job_i, result) in enumerate(pool.imap_unordered(_traceTile, enumerate(jobs)), 1):
+                results[job_i] = result
+                if progress:
+                    progress(done_n / len(jobs))
+    finally:
+        if in_main_thread:
+            signal.signal(signal.SIGTERM, previous_handler)
+
+    return _stitchTiles(results, TILE_STITCH_TOLERANCE)
+
+def _traceTile(indexed_job):
+    job_i, (trace_func, tile, origin, core) = indexed_job
+    tile_curves = trace_func(tile)
+    if not isinstance(tile_curves, CurveSet):
+        tile_curves = CurveSet(tile_curves)
+    tile_curves.points += origin
+    tile_curves = _splitAtCore(tile_curves, core)
+    curves = tile_curves.points
 
+    midpoints = (curves[:, 0] + 3 * curves[:, 1] + 3 * curves[:, 2] + curves[:, 3]) / 8
+    keep = (
+        (midpoints[:, 0] >= core[0]) & (midpoints[:, 0] < core[2]) &
+        (midpoints[:, 1] >= core[1]) & (midpoints[:, 1] < core[3])
+    )
+
+    # an end is open if the curve it continued into was cut away
+    linked = numpy.all(curves[1:, 0] == curves[:-1, 3], axis=1)
+    start_open = numpy.zeros(len(curves), dtype=bool)
+    start_open[1:] = linked & ~keep[:-1]
+    end_open = numpy.zeros(len(curves), dtype=bool)
+    end_open[:-1] = linked & ~keep[1:]
+
+    return job_i, (tile_curves[keep], start_open[keep], end_open[keep])
+
+def _splitAtCore(curve_set, core):
+    """Halve the curves that cross the edge of core until they are shorter than
+    TILE_SPLIT_LENGTH, so keeping curves by midpoint cuts close to the seam"""
+    for _ in range(TILE_SPLIT_DEPTH):
+        curves = curve_set.points
+        low, high = curves.min(axis=1), curves.max(axis=1)
+        touches = numpy.all((high >= core[:2]) & (low < core[2:]), axis=1)
+        inside = numpy.all((low >= core[:2]) & (high < core[2:]), axis=1)
+        split = touches & ~inside & numpy.any(high - low > TILE_SPLIT_LENGTH, axis=1)
+        if not split.any():
+            break
+
+        halves = numpy.repeat(numpy.arange(len(curves)), numpy.where(split, 2, 1))
+        curve_set = curve_set[halves]
+        first_half = numpy.flatnonzero(split) + numpy.arange(split.sum())
+        curve_set.points[first_half], curve_set.points[first_half + 1] = bezierSplit(curves[split])
+    return curve_set
 
-def minimizeAir(bezier):
-    """Optimize the order of bezier curves."""
-    # TODO travelling salesman problem
-    return bezier
+def _stitchTiles(results, tolerance):
+    """Join the tiles' pieces (runs of connected curves) at their open ends into strokes.
+    Open ends of different tiles are paired closest first, a gap is bridged with a
+    straight curve, and pieces are reversed where their ends meet head to head or tail to tail."""
+    curve_set = CurveSet.concatenate(result[0] for result in results)
+    curves = curve_set.points
+    if len(curves) == 0:
+        return curve_set
+    tile_of_curve = numpy.repeat(numpy.arange(len(results)), [len(result[0]) for result in results])
+    start_open = numpy.concatenate([result[1] for result in results])
+    end_open = numpy.concatenate([result[2] for result in results])
 
+    # pieces: runs of curves of one tile that continue each other
+    continues = numpy.all(curves[1:, 0] == curves[:-1, 3], axis=1) & (tile_of_curve[1:] == tile_of_curve[:-1])
+    piece_firsts = numpy.flatnonzero(numpy.concatenate(([True], ~continues)))
+    piece_lasts = numpy.append(piece_firsts[1:], len(curves)) - 1
+    piece_n = len(piece_firsts)
 
+    # open ends, id < piece_n: piece head, else piece tail
+    ends = numpy.concatenate((piece_firsts, piece_lasts))
+    is_open = numpy.concatenate((start_open[piece_firsts], end_open[piece_lasts]))
+    end_points = numpy.concatenate((curves[piece_firsts, 0], curves[piece_lasts, 3]))
+    end_tiles = tile_of_curve[ends]
+    open_ends = numpy.flatnonzero(is_open)
+    open_points = end_points[open_ends]
+
+    # pair ends of different tiles, closest pairs first
+    grid = spatial.PointGrid(open_points, max(tolerance, 1))
+    pairs = []
+    for open_i, (x, y) in enumerate(open_points.tolist()):
+        candidates = grid.within(x, y, tolerance)
+        candidates = candidates[(candidates > open_i) & (end_tiles[open_ends[candidates]] != end_tiles[open_ends[open_i]])]
+        distances = numpy.hypot(*(open_points[candidates] - (x, y)).T)
+        pairs.extend(zip(distances.tolist(), [open_i] * len(candidates), candidates.tolist()))
+    pairs.sort()
+
+    partner = numpy.full(2 * piece_n, -1)
+    for distance, open_i, other_i in pairs:
+        end, other = open_ends[open_i], open_ends[other_i]
+        if partner[end] < 0 and partner[other] < 0 and end % piece_n != other % piece_n:
+            partner[end], partner[other] = other, end
+
+    # walk the chains of pieces, from a free end where there is one, closed loops last
+    visited = numpy.zeros(piece_n, dtype=bool)
+    starts = [end for end in range(2 * piece_n) if partner[end] < 0] + list(range(piece_n))
+    parts = []
+    part_strokes = []
+    stroke = -1
+    for start in starts:
+        if visited[start % piece_n]:
+            continue
+        stroke += 1
+        end = start
+        while True:
+            piece = end % piece_n
+            visited[piece] = True
+            piece_curves = curve_set[numpy.arange(piece_firsts[piece], piece_lasts[piece] + 1)]
+            if end >= piece_n: # entered at its tail
+                piece_curves = piece_curves[::-1]
+                piece_curves.reverse(numpy.ones(len(piece_curves), dtype=bool))
+            parts.append(piece_curves)
+            part_strokes.append(stroke)
 
-def _ptPoint_to_numpy(ptPoint): # potrace
-    return numpy.array((ptPoint.x, ptPoint.y))
+            exit_end = (end + piece_n) % (2 * piece_n)
+            next_end = partner[exit_end]
+            if next_end >= 0 and (not visited[next_end % piece_n] or next_end == start):
+                start_point, end_point = end_points[exit_end], end_points[next_end]
+                if numpy.any(start_point != end_point):
+                    parts.append(CurveSet([start_point + (end_point - start_point) * t for t in (0, 1 / 3, 2 / 3, 1)], dtype=curves.dtype))
+                    part_strokes.append(stroke)
+            if next_end < 0 or visited[next_end % piece_n]:
+                break
+            end = next_end
 
-def _spPoint_to_numpy(spPoint): # svg.path
-    return numpy.array((spPoint.real, spPoint.imag))
+    stitched = CurveSet.concatenate(parts)
+    stitched.stroke = numpy.repeat(numpy.array(part_strokes, dtype=numpy.int32), [len(part) for part in parts])
+    return stitched
+
+def minimizeAir(bezier, time_budget=MINIMIZE_TIME_BUDGET, progress=None):
+    """Optimize the order and direction of strokes to minimize pen-up travel.
+    Greedy nearest neighbour tour, then 2-opt and Or-opt passes until one barely
+    improves the tour or time_budget runs out.
+    progress(fraction) is called now and then, if given.
+    Returns a CurveSet in drawing order, stroke ids numbered along the tour,
+    and the pen-up travel (before, after) in curve units."""
+    if not isinstance(bezier, CurveSet):
+        bezier = CurveSet(bezier)
+    curves = bezier.points
+    if len(curves) == 0:
+        return bezier, (0.0, 0.0)
+
+    deadline = time.perf_counter() + time_budget
+
+    # strokes: runs of curves that continue each other
+    breaks = numpy.flatnonzero(numpy.any(curves[1:, 0] != curves[:-1, 3], axis=1)) + 1
+    stroke_starts = numpy.concatenate(([0], breaks))
+    stroke_counts = numpy.diff(numpy.append(stroke_starts, len(curves)))
+    heads = curves[stroke_starts, 0]
+    tails = curves[stroke_starts + stroke_counts - 1, 3]
+
+    air_before = _airDistance(heads, tails)
+    tour, flipped = _nearestNeighbourTour(heads, tails, progress)
+    _improveTour(heads, tails, tour, flipped, deadline, progress)
+
+    ordered_heads = numpy.where(flipped[:, None], tails[tour], heads[tour])
+    ordered_tails = numpy.where(flipped[:, None], heads[tour], tails[tour])
+    air_after = _airDistance(ordered_heads, ordered_tails)
+
+    # expand strokes back into curves, reversed strokes run backwards
+    counts = stroke_counts[tour]
+    offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    reversed_curves = numpy.repeat(flipped, counts)
+    offsets[reversed_curves] = (numpy.repeat(counts, counts) - 1 - offsets)[reversed_curves]
+
+    ordered = bezier[numpy.repeat(stroke_starts[tour], counts) + offsets]
+    ordered.reverse(reversed_curves)
+    ordered.stroke = numpy.repeat(numpy.arange(len(tour), dtype=numpy.int32), counts)
+    return ordered, (float(air_before), float(air_after))
+
+def _airDistance(heads, tails):
+    return numpy.hypot(*(heads[1:] - tails[:-1]).T).sum()
+
+def _nearestNeighbourTour(heads, tails, progress=None):
+    """Greedy tour from the first stroke, entering each stroke at its closer end.
+    Returns stroke order and per-position reversal flags."""
+    stroke_n = len(heads)
+    endpoints = numpy.concatenate((heads, tails)) # id < stroke_n: head, else tail
+    alive = numpy.ones(len(endpoints), dtype=bool)
+    alive_n = len(endpoints)
+    grid = spatial.PointGrid(endpoints, spatial.cellSize(endpoints))
+
+    tour = numpy.empty(stroke_n, dtype=numpy.int64)
+    flipped = numpy.zeros(stroke_n, dtype=bool)
+    stroke, flip = 0, False
+    for position in range(stroke_n):
+        if progress and position % 1024 == 0:
+            progress(position / stroke_n / 2)
+
+        tour[position] = stroke
+        flipped[position] = flip
+        alive[stroke] = alive[stroke + stroke_n] = False
+        alive_n -= 2
+
+        if alive_n == 0:
+            break
+
+        x, y = (heads if flip else tails)[stroke]
+        found, _ = grid.nearest(x, y, alive=alive, max_rings=MINIMIZE_MAX_RINGS)
+        if len(found) == 0:
+            # the neighbourhood ran dry, regrid the remaining endpoints coarser
+            if alive_n < len(grid) / 2:
+                remaining = numpy.flatnonzero(alive)
+                grid = spatial.PointGrid(endpoints[remaining], spatial.cellSize(endpoints[remaining]), remaining)
+            found, _ = grid.nearest(x, y, alive=alive)
+
+        stroke = int(found[0]) % stroke_n
+        flip = bool(found[0] >= stroke_n)
+
+    return tour, flipped
+
+def _improveTour(heads, tails, tour, flipped, deadline, progress=None):
+    """2-opt (reverse a run of strokes) and Or-opt (move one stroke) in place.
+    Candidates are endpoints closer to a stroke's tail than its current successor."""
+    stroke_n = len(tour)
+    if stroke_n < 3:
+        return
+
+    endpoints = numpy.concatenate((heads, tails))
+    grid = spatial.PointGrid(endpoints, spatial.cellSize(endpoints))
+
+    # per position, in travel direction
+    head_xy = numpy.where(flipped[:, None], tails[tour], heads[tour])
+    tail_xy = numpy.where(flipped[:, None], heads[tour], tails[tour])
+    position_of = numpy.empty(stroke_n, dtype=numpy.int64)
+    position_of[tour] = numpy.arange(stroke_n)
+
+    def dist(a, b):
+        return math.hypot(a[0] - b[0], a[1] - b[1])
+
+    def edge(position):
+        if position < 0 or position >= stroke_n - 1:
+            return 0.0
+        return dist(tail_xy[position], head_xy[position + 1])
+
+    def reorder(start, stop, order):
+        for array in (tour, flipped, head_xy, tail_xy):
+            array[start:stop] = array[start:stop][order]
+        position_of[tour[start:stop]] = numpy.arange(start, stop)
+
+    budget = deadline - time.perf_counter()
+    air = sum(edge(position) for position in range(stroke_n - 1))
+
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        gain = 0.0
+        for a in range(stroke_n - 1):
+            if a % 256 == 0:
+                remaining = deadline - time.perf_counter()
+                if remaining < 0:
+                    return
+                if progress:
+                    progress(1 - remaining / budget / 2)
+
+            tail_a = tail_xy[a]
+            edge_a = edge(a)
+            if edge_a == 0:
+                continue
+
+            candidates, _ = grid.nearest(tail_a[0], tail_a[1], k=MINIMIZE_NEIGHBOURS, radius=edge_a, max_rings=MINIMIZE_MAX_RINGS)
+            for endpoint in candidates.tolist():
+                b = int(position_of[endpoint % stroke_n])
+                if b == a:
+                    continue
+
+                if (endpoint >= stroke_n) != flipped[b]:
+                    # tail of b: reverse the run between a and b
+                    low, high = min(a, b), max(a, b)
+                    head_next = head_xy[high + 1] if high + 1 < stroke_n else None
+                    delta = dist(tail_xy[low], tail_xy[high]) - edge(low) - edge(high)
+                    if head_next is not None:
+                        delta += dist(head_xy[low + 1], head_next)
+                    if delta >= -1e-9:
+                        continue
+
+                    gain -= delta
+                    segment = slice(low + 1, high + 1)
+                    head_xy[segment], tail_xy[segment] = tail_xy[segment].copy(), head_xy[segment].copy()
+                    flipped[segment] = ~flipped[segment]
+                    reorder(low + 1, high + 1, slice(None, None, -1))
+                else:
+                    # head of b: move stroke b right behind a
+                    if b == a + 1:
+                        continue
+                    delta = dist(tail_a, head_xy[b]) - edge_a - edge(b - 1) - edge(b)
+                    if a + 1 < stroke_n:
+                        delta += dist(tail_xy[b], head_xy[a + 1])
+                    if 0 < b < stroke_n - 1:
+                        delta += dist(tail_xy[b - 1], head_xy[b + 1])
+                    if delta >= -1e-9:
+                        continue
+
+                    gain -= delta
+                    if b > a:
+                        reorder(a + 1, b + 1, numpy.roll(numpy.arange(b - a), 1))
+                    else:
+                        reorder(b, a + 1, numpy.roll(numpy.arange(a + 1 - b), -1))
+
+                break
+
+        improved = gain > air * MINIMIZE_MIN_GAIN
+        air -= gain
+
+
+
+def _ptPoint_to_tuple(ptPoint): # potrace
+    return (ptPoint.x, ptPoint.y)
 
 def _vtTransform_to_numpy(spTransform): # vtracer
+    if not spTransform:
+        return numpy.zeros(2)
+
     split_tf = spTransform[len("transform("):-len(")")].split(",")
     return numpy.array((float(split_tf[0]), float(split_tf[1])))
\ No newline at end of file
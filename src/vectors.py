@@ -0,0 +1,209 @@
+import re
+import math
+import numpy
+from xml.etree import cElementTree
+from PIL import Image, ImageDraw
+
+import svg.path as svgpath
+
+from curves import CurveSet
+
+
+# Config
+SVG_EXTENSIONS = (".svg",)
+SVG_ARC_SEGMENTS = 8
+SVG_SKIPPED_TAGS = {"defs", "clipPath", "mask", "symbol", "marker", "pattern", "style", "script", "title", "desc", "metadata"}
+PREVIEW_STEPS = 16 # samples per curve when drawing the editor preview
+
+_SVG_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_SVG_TRANSFORM = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+_KAPPA = 4 / 3 * (math.sqrt(2) - 1) # quarter ellipse control distance
+
+
+class VectorImage:
+    """SVG artwork as cubic curves in its own units, origin at the top left.
+    Stands in for a PIL image in the editor (width, height, resize) and makes
+    the planner skip rasterizing and tracing."""
+
+    def __init__(self, curves, width, height):
+        self.curves = curves
+        self.width = width
+        self.height = height
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def resize(self, size, resample=None):
+        """Black on white RGB rendering of size (width, height), like PIL's Image.resize"""
+        img = Image.new("RGB", size, color=(255, 255, 255))
+        draw = ImageDraw.Draw(img)
+
+        t = numpy.linspace(0, 1, PREVIEW_STEPS)[:, None]
+        weights = numpy.concatenate(((1-t)**3, 3*(1-t)**2*t, 3*(1-t)*t**2, t**3), axis=1)
+        scale = numpy.array((size[0] / self.width, size[1] / self.height))
+        samples = numpy.einsum("sk,nkd->nsd", weights, self.curves.points) * scale
+
+        for line in samples.reshape(len(samples), -1).tolist():
+            draw.line(line, fill=(0, 0, 0))
+
+        return img
+
+
+def openImage(path):
+    """PIL image with its pixels loaded, or a VectorImage for SVG files"""
+    if path.lower().endswith(SVG_EXTENSIONS):
+        return loadSvg(path)
+
+    with Image.open(path) as image:
+        image.load()
+    return image
+
+def loadSvg(path):
+    """Paths and basic shapes of an SVG file, transforms applied, as a VectorImage.
+    The viewBox (or width/height, or the artwork's bounds) defines the image area.
+    Fills, strokes and rounded rect corners are ignored, every outline is drawn once."""
+    root = cElementTree.parse(path).getroot()
+
+    view_box = _numbers(root.get("viewBox", ""))
+    if len(view_box) == 4:
+        min_x, min_y, width, height = view_box
+    else:
+        min_x = min_y = 0
+        width, height = _length(root.get("width")), _length(root.get("height"))
+
+    curve_sets = []
+    _collectCurves(root, numpy.eye(3), curve_sets)
+    curves = CurveSet.concatenate(curve_sets) if curve_sets else CurveSet()
+
+    if not width or not height:
+        if len(curves) == 0:
+            raise ValueError("SVG has no size and no drawable elements")
+        low, high = curves.points.reshape(-1, 2).min(axis=0), curves.points.reshape(-1, 2).max(axis=0)
+        (min_x, min_y), (width, height) = low, numpy.maximum(high - low, 1e-6)
+
+    return VectorImage(curves.translate((-min_x, -min_y)), float(width), float(height))
+
+def parsePath(path_d):
+    """Any SVG path via svg.path -> (N, 4, 2) array of cubic curves"""
+    curves = []
+    for segment in svgpath.parse_path(path_d):
+        if isinstance(segment, svgpath.Move):
+            continue
+
+        start, end = _spPoint_to_numpy(segment.start), _spPoint_to_numpy(segment.end)
+        if isinstance(segment, svgpath.CubicBezier):
+            curves.append([start, _spPoint_to_numpy(segment.control1), _spPoint_to_numpy(segment.control2), end])
+        elif isinstance(segment, svgpath.QuadraticBezier):
+            control = _spPoint_to_numpy(segment.control)
+            curves.append([start, start + (control - start) * 2 / 3, end + (control - end) * 2 / 3, end])
+        elif isinstance(segment, svgpath.Arc):
+            arc_points = [_spPoint_to_numpy(segment.point(t)) for t in numpy.linspace(0, 1, SVG_ARC_SEGMENTS + 1)]
+            for arc_start, arc_end in zip(arc_points[:-1], arc_points[1:]):
+                curves.append([arc_start, arc_start + (arc_end - arc_start) / 3, arc_end - (arc_end - arc_start) / 3, arc_end])
+        elif not numpy.array_equal(start, end): # Line, Close
+            curves.append([start, start + (end - start) / 3, end - (end - start) / 3, end])
+
+    return numpy.array(curves, dtype=numpy.float64).reshape(-1, 4, 2)
+
+def _collectCurves(element, matrix, curve_sets):
+    """Walk the element tree depth first, appending a CurveSet per drawable element"""
+    for child in element:
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag in SVG_SKIPPED_TAGS or child.get("display") == "none":
+            continue
+
+        child_matrix = matrix @ _transformMatrix(child.get("transform", ""))
+        if tag == "g" or tag == "svg" or tag == "a":
+            _collectCurves(child, child_matrix, curve_sets)
+            continue
+
+        curves, single = _shapeCurves(tag, child)
+        if curves is None or len(curves) == 0:
+            continue
+
+        points = curves.reshape(-1, 2) @ child_matrix[:2, :2].T + child_matrix[:2, 2]
+        layer = numpy.full(len(curves), len(curve_sets))
+        stroke = numpy.zeros(len(curves)) if single else None # one outline, or let minimizeAir find the subpaths
+        curve_sets.append(CurveSet(points, layer, stroke))
+
+def _shapeCurves(tag, element):
+    """(N, 4, 2) curves of one SVG element and whether they form a single continuous outline"""
+    get = lambda name: _length(element.get(name)) or 0
+
+    if tag == "path":
+        return parsePath(element.get("d", "")), False
+    if tag == "rect":
+        x, y, w, h = get("x"), get("y"), get("width"), get("height")
+        if w <= 0 or h <= 0:
+            return None, True
+        return _polylineCurves([(x, y), (x + w, y), (x + w, y + h), (x, y + h)], True), True
+    if tag == "circle":
+        return _ellipseCurves(get("cx"), get("cy"), get("r"), get("r")), True
+    if tag == "ellipse":
+        return _ellipseCurves(get("cx"), get("cy"), get("rx"), get("ry")), True
+    if tag == "line":
+        return _polylineCurves([(get("x1"), get("y1")), (get("x2"), get("y2"))], False), True
+    if tag in ("polyline", "polygon"):
+        numbers = _numbers(element.get("points", ""))
+        points = numpy.array(numbers[:len(numbers) // 2 * 2]).reshape(-1, 2)
+        return _polylineCurves(points, tag == "polygon"), True
+    return None, False
+
+def _polylineCurves(points, closed):
+    """Straight cubics along points, controls on the chord thirds"""
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+    if closed and len(points) > 2:
+        points = numpy.concatenate((points, points[:1]))
+    starts, ends = points[:-1], points[1:]
+    chords = ends - starts
+    return numpy.stack((starts, starts + chords / 3, ends - chords / 3, ends), axis=1)
+
+def _ellipseCurves(cx, cy, rx, ry):
+    """Four quarter-ellipse cubics, clockwise from the rightmost point"""
+    if rx <= 0 or ry <= 0:
+        return None
+    unit = numpy.array([
+        [(1, 0), (1, _KAPPA), (_KAPPA, 1), (0, 1)],
+        [(0, 1), (-_KAPPA, 1), (-1, _KAPPA), (-1, 0)],
+        [(-1, 0), (-1, -_KAPPA), (-_KAPPA, -1), (0, -1)],
+        [(0, -1), (_KAPPA, -1), (1, -_KAPPA), (1, 0)]
+    ])
+    return unit * (rx, ry) + (cx, cy)
+
+def _transformMatrix(transform):
+    """SVG transform attribute -> 3x3 affine matrix"""
+    matrix = numpy.eye(3)
+    for name, arguments in _SVG_TRANSFORM.findall(transform):
+        values = _numbers(arguments)
+        step = numpy.eye(3)
+        if name == "matrix" and len(values) == 6:
+            step[:2] = numpy.array(values).reshape(3, 2).T
+        elif name == "translate" and values:
+            step[:2, 2] = (values[0], values[1] if len(values) > 1 else 0)
+        elif name == "scale" and values:
+            step[0, 0], step[1, 1] = values[0], values[1] if len(values) > 1 else values[0]
+        elif name == "rotate" and values:
+            angle = math.radians(values[0])
+            cos, sin = math.cos(angle), math.sin(angle)
+            cx, cy = (values[1], values[2]) if len(values) == 3 else (0, 0)
+            step[:2] = ((cos, -sin, cx - cos * cx + sin * cy), (sin, cos, cy - sin * cx - cos * cy))
+        elif name == "skewX" and values:
+            step[0, 1] = math.tan(math.radians(values[0]))
+        elif name == "skewY" and values:
+            step[1, 0] = math.tan(math.radians(values[0]))
+        matrix = matrix @ step
+    return matrix
+
+def _numbers(text):
+    return [float(number) for number in _SVG_NUMBER.findall(text)]
+
+def _length(value):
+    """Leading number of an SVG length ("210mm" -> 210.0), None if missing or relative"""
+    if not value or value.strip().endswith("%"):
+        return None
+    numbers = _SVG_NUMBER.findall(value)
+    return float(numbers[0]) if numbers else None
+
+def _spPoint_to_numpy(spPoint): # svg.path
+    return numpy.array((spPoint.real, spPoint.imag))
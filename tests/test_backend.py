@@ -0,0 +1,169 @@
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import backend
+
+
+def randomToolpath(n=20, seed=0):
+    """Strokes of 1 to 6 random points in mm, some of them single points"""
+    rng = numpy.random.default_rng(seed)
+    counts = rng.integers(1, 7, n)
+    return rng.uniform(10, 140, (counts.sum(), 2)), counts
+
+def states(lines):
+    """(motion, x, y, z) after every line that changes the position, rounded to the compact precision"""
+    position = [None, None, None]
+    motion = None
+    result = []
+    for line in lines:
+        words = line.split()
+        if words[0] in ("G0", "G1"):
+            motion = words.pop(0)
+        elif words[0][0] not in "XYZ":
+            continue
+        before = list(position)
+        for word in words:
+            if word[0] in "XYZ":
+                position["XYZ".index(word[0])] = round(float(word[1:]), backend.GCODE_PRECISION)
+        if position != before:
+            result.append((motion, *position))
+    return result
+
+
+@pytest.mark.parametrize("modal", [False, True])
+def test_compact_moves_match_verbose(monkeypatch, modal):
+    toolpath = randomToolpath()
+    settings = dict(backend.DEFAULT_SETTINGS, pen_x=1.5, pen_y=-2.25)
+    monkeypatch.setattr(backend, "GCODE_MODAL_MOTION", modal)
+    monkeypatch.setattr(backend, "GCODE_COMPACT", False)
+    verbose = list(backend.generateGcode(toolpath, settings))
+    monkeypatch.setattr(backend, "GCODE_COMPACT", True)
+    compact = list(backend.generateGcode(toolpath, settings))
+
+    assert states(compact) == states(verbose)
+    assert len("\n".join(compact)) < len("\n".join(verbose))
+    if modal:
+        assert any(line[0] in "XYZ" for line in compact)
+
+def test_compact_moves_drop_repeats_and_collinear_points():
+    points = numpy.array([[10, 10], [10, 10], [20, 10], [30, 10], [30, 20]], dtype=float)
+    lines = list(backend.compactMoves(points, numpy.array([5]), backend.DEFAULT_SETTINGS))
+    assert lines == ["G0 X100 Y75 Z150", "G0 X10 Y10 Z2", "G1 Z1", "G1 X30", "G1 Y20", "G0 Z2", "G0 X100 Y75 Z150"]
+
+def test_compact_moves_empty_toolpath():
+    lines = list(backend.compactMoves(numpy.zeros((0, 2)), numpy.zeros(0, dtype=int), backend.DEFAULT_SETTINGS))
+    assert lines == ["G0 X100 Y75 Z150"]
+
+def rdp(points, tolerance):
+    """Recursive Ramer-Douglas-Peucker with point to segment distances, the reference for simplifyStrokes"""
+    if len(points) < 3:
+        return points
+    start, chord = points[0], points[-1] - points[0]
+    offsets = points[1:-1] - start
+    t = numpy.clip(offsets @ chord / (chord @ chord if chord.any() else 1), 0, 1)
+    distances = numpy.hypot(*(offsets - t[:, None] * chord).T)
+    farthest = int(numpy.argmax(distances)) + 1
+    if distances[farthest - 1] <= tolerance:
+        return points[[0, -1]]
+    return numpy.concatenate((rdp(points[:farthest + 1], tolerance)[:-1], rdp(points[farthest:], tolerance)))
+
+def test_simplify_strokes_matches_recursive_rdp():
+    rng = numpy.random.default_rng(1)
+    counts = rng.integers(1, 40, 50)
+    points = numpy.cumsum(rng.normal(0, 1, (counts.sum(), 2)), axis=0)
+    points[:counts[0]] = points[0] # fully degenerate
+    points[counts[0] + counts[1] - 1] = points[counts[0]] # closed
+
+    simple, simple_counts = backend.simplifyStrokes(points, counts, 0.5)
+    strokes = numpy.split(points, numpy.cumsum(counts)[:-1])
+    expected = [rdp(stroke, 0.5) for stroke in strokes]
+    assert simple_counts.tolist() == [len(stroke) for stroke in expected]
+    numpy.testing.assert_array_equal(simple, numpy.concatenate(expected))
+
+def test_simplify_strokes_drops_dots():
+    points = numpy.array([[0, 0], [0.1, 0.1], [5, 5], [0, 0], [3, 0], [6, 0]], dtype=float)
+    simple, counts = backend.simplifyStrokes(points, numpy.array([2, 1, 3]), 0.5, min_size=1)
+    assert counts.tolist() == [2]
+    numpy.testing.assert_array_equal(simple, [[0, 0], [6, 0]])
+
+def test_drop_coincident_removes_retraced_stroke():
+    points = numpy.array([[0, 0], [10, 0], [10, 10], [10, 10.1], [10, 0.1], [0, 0.1]], dtype=float)
+    kept, counts = backend.dropCoincident(points, numpy.array([3, 3]), 0.25, 2)
+    assert counts.tolist() == [3]
+    numpy.testing.assert_array_equal(kept, points[:3])
+
+def test_drop_coincident_splits_around_shared_edge():
+    first = [[0, 0], [20, 0]]
+    second = [[0, -5], [5, 0], [15, 0], [20, -5]] # runs along the first stroke from x 5 to 15
+    points = numpy.array(first + second, dtype=float)
+    kept, counts = backend.dropCoincident(points, numpy.array([2, 4]), 0.25, 2)
+    assert counts.tolist() == [2, 2, 2]
+    numpy.testing.assert_array_equal(kept[2:], [[0, -5], [5, 0], [15, 0], [20, -5]])
+
+def test_drop_coincident_keeps_crossings_and_self_retracing():
+    crossing = [[0, 0], [10, 0], [5, -5], [5, 5]]
+    back_and_forth = [[0, 20], [10, 20], [0, 20]] # only lower strokes count, a stroke never covers itself
+    points = numpy.array(crossing + back_and_forth, dtype=float)
+    kept, counts = backend.dropCoincident(points, numpy.array([2, 2, 3]), 0.25, 2)
+    assert counts.tolist() == [2, 2, 3]
+    numpy.testing.assert_array_equal(kept, points)
+
+def test_drop_coincident_handles_zero_length_segments():
+    points = numpy.array([[0, 0], [10, 0], [3, 0], [3, 0], [5, 5], [5, 5]], dtype=float)
+    with numpy.errstate(all="raise"):
+        kept, counts = backend.dropCoincident(points, numpy.array([2, 2, 2]), 0.25, 2)
+    assert counts.tolist() == [2, 2, 2]
+
+def square(x0, y0, x1, y1):
+    """Outline of a rectangle as four straight cubic curves"""
+    corners = numpy.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]], dtype=float)
+    start, end = corners[:-1], corners[1:]
+    return numpy.stack((start, start + (end - start) / 3, end - (end - start) / 3, end), axis=1)
+
+@pytest.mark.parametrize("angle", [0, 90, 45])
+def test_hatch_fill_skips_holes(angle):
+    from PIL import Image, ImageDraw
+    from curves import CurveSet
+
+    outlines = CurveSet(numpy.concatenate((square(10, 10, 110, 110), square(40, 40, 80, 80))), None, numpy.repeat([0, 1], 4))
+    bitmap = Image.new("L", (120, 120), 255)
+    draw = ImageDraw.Draw(bitmap)
+    draw.rectangle((10, 10, 110, 110), fill=0)
+    draw.rectangle((40, 40, 80, 80), fill=255)
+
+    hatches = backend.hatchFill(outlines, bitmap, numpy.zeros(2), 4, angle)
+    assert len(hatches) > 0
+
+    # sample every hatch segment: inside the outer square, never through the hole
+    # (turns between scanlines may cut a corner by up to a spacing)
+    ends = numpy.asarray(hatches.points)[:, [0, 3]]
+    t = numpy.linspace(0, 1, 50)[None, :, None]
+    samples = (ends[:, :1] + t * (ends[:, 1:] - ends[:, :1])).reshape(-1, 2)
+    assert numpy.all((samples >= 10 - 1e-6) & (samples <= 110 + 1e-6))
+    assert not numpy.any(numpy.all((samples > 40 + 4) & (samples < 80 - 4), axis=1))
+
+    # the ring is covered: hatch lines cross the bands beside the hole
+    drawn = numpy.hypot(*(ends[:, 1] - ends[:, 0]).T).sum()
+    assert drawn > (100 ** 2 - 40 ** 2) / 4 * 0.9
+
+def test_chain_strokes_joins_touching_ends():
+    points = numpy.array([
+        [0, 0], [10, 0],    # a
+        [10, 0], [10, 10],  # b, continues a exactly
+        [50, 50], [60, 50], # c, far away
+        [0, 10.02], [10, 10] # d, ends within tolerance of b's end, reversed to join
+    ], dtype=float)
+    chained, counts = backend.chainStrokes(points, numpy.array([2, 2, 2, 2]), 0.05)
+    assert counts.tolist() == [4, 2]
+    numpy.testing.assert_array_equal(chained, [[0, 0], [10, 0], [10, 10], [0, 10.02], [50, 50], [60, 50]])
+
+def test_chain_strokes_keeps_distant_strokes():
+    points, counts = randomToolpath()
+    chained, chained_counts = backend.chainStrokes(points, counts, 0.0)
+    assert chained_counts.tolist() == counts.tolist()
+    numpy.testing.assert_array_equal(chained, points)
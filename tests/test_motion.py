@@ -0,0 +1,49 @@
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import backend
+import motion
+
+
+def test_long_move_cruises():
+    # 10 mm/s reached after 0.1 mm, trapezoid: distance / speed + speed / acceleration
+    line_times, summary = motion.estimateMotion(["G1 F600", "G1 X100"])
+    assert summary["total"] == pytest.approx(100 / 10 + 10 / motion.ACCELERATION)
+    assert summary["draw"] == summary["total"]
+    assert summary["travel"] == 0
+
+def test_short_move_never_cruises():
+    # triangle profile: accelerate over half the distance, brake over the other half
+    _, summary = motion.estimateMotion(["G0 F60000", "G0 X1"])
+    assert summary["total"] == pytest.approx(2 * (1 / motion.ACCELERATION) ** 0.5)
+    assert summary["travel"] == summary["total"]
+
+def test_straight_junction_keeps_speed():
+    _, split = motion.estimateMotion(["G1 F600", "G1 X50", "G1 X100"])
+    _, single = motion.estimateMotion(["G1 F600", "G1 X100"])
+    assert split["total"] == pytest.approx(single["total"])
+
+    _, corner = motion.estimateMotion(["G1 F600", "G1 X50", "G1 Y50"])
+    assert corner["total"] > split["total"]
+
+def test_home_and_dwell():
+    line_times, summary = motion.estimateMotion(["G28", "G4 P500", "G4 S2"])
+    assert summary["total"] == pytest.approx(motion.HOME_TIME + 2.5)
+    assert line_times.tolist() == pytest.approx([motion.HOME_TIME, motion.HOME_TIME + 0.5, motion.HOME_TIME + 2.5])
+
+def test_program_times_and_lifts():
+    points = numpy.array([[10, 10], [20, 10], [20, 20], [50, 50], [60, 50], [70, 70]], dtype=float)
+    toolpath = points, numpy.array([3, 1, 2])
+    lines = list(backend.generateGcode(toolpath, backend.DEFAULT_SETTINGS))
+    line_times, summary = motion.estimateMotion(lines)
+
+    assert len(line_times) == len(lines)
+    assert numpy.all(numpy.diff(line_times) >= 0)
+    assert line_times[-1] == pytest.approx(summary["total"])
+    assert summary["draw"] + summary["travel"] == pytest.approx(summary["total"])
+    assert summary["lifts"] == 3 # the single point stroke lowers the pen too
@@ -0,0 +1,91 @@
+import os
+import re
+import sys
+import queue
+import functools
+import operator
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import sender
+
+
+class FakeMarlin:
+    """Port answering numbered lines like Marlin, failing the checksum of the given line numbers once"""
+
+    def __init__(self, corrupt=(), resend=None):
+        self.corrupt = set(corrupt)
+        self.resend = resend # (after line, line to request), a single out of history request
+        self.replies = queue.Queue()
+        self.executed = []
+        self.last_line = 0
+        self.writes = 0
+        self.timeout = None
+
+    def write(self, data):
+        self.writes += 1
+        numbered = re.match(r"N(\d+) (.*)\*(\d+)$", data.decode().strip())
+        number, line, checksum = int(numbered.group(1)), numbered.group(2), int(numbered.group(3))
+        assert checksum == functools.reduce(operator.xor, f"N{number} {line}".encode(), 0)
+        if number in self.corrupt or number != self.last_line + 1 and not line.startswith("M110"):
+            self.corrupt.discard(number)
+            for reply in (f"Error:checksum mismatch, Last Line: {self.last_line}", f"Resend: {self.last_line + 1}", "ok"):
+                self.replies.put(reply)
+            return
+        self.last_line = number
+        if not line.startswith("M110"):
+            self.executed.append(line)
+        if self.resend and number == self.resend[0]:
+            self.replies.put(f"Resend: {self.resend[1]}")
+        self.replies.put("ok")
+
+    def readline(self):
+        try:
+            return f"{self.replies.get(timeout=self.timeout)}\n".encode()
+        except queue.Empty:
+            return b""
+
+
+def run(port, lines, **options):
+    events = queue.Queue()
+    gcode_sender = sender.GcodeSender(port, lines, events, protocol="window", window=4, line_numbers=True, **options)
+    gcode_sender.start()
+    gcode_sender.join(10)
+    assert not gcode_sender.is_alive()
+    return [event for event in events.queue if event[0] != "progress"][-1], gcode_sender
+
+JOB = [f"G1 X{i}" for i in range(100)]
+
+
+def test_resends_corrupted_lines_in_order():
+    port = FakeMarlin(corrupt=(3, 4, 50, 100))
+    result, _ = run(port, iter(JOB))
+    assert result == ("done",)
+    assert port.executed == JOB
+    assert port.writes > len(JOB) + 1
+
+def test_pulls_lines_as_they_are_sent():
+    pulled = []
+    def lines():
+        for line in JOB:
+            pulled.append(line)
+            yield line
+
+    port = FakeMarlin()
+    port_write = port.write
+    pulled_at_write = []
+    def write(data):
+        pulled_at_write.append(len(pulled))
+        port_write(data)
+    port.write = write
+
+    result, gcode_sender = run(port, lines(), total=len(JOB))
+    assert result == ("done",)
+    assert all(count <= line_i + 1 for line_i, count in enumerate(pulled_at_write)) # M110 N0 comes first
+    assert len(gcode_sender.history) <= sender.HISTORY_LINES
+
+def test_resend_beyond_history_fails(monkeypatch):
+    monkeypatch.setattr(sender, "HISTORY_LINES", 8)
+    result, _ = run(FakeMarlin(resend=(60, 2)), iter(JOB))
+    assert result[0] == "error"
+    assert "Resend of line 2" in result[1]
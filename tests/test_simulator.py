@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import queue
+
+import pytest
+import serial
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import sender
+import simulator
+
+
+JOB = ["G21", "G90", "G0 Z5 F1200", "G1 F1000"] + [f"G1 X{i % 50 + 1} Y{i * 7 % 40}" for i in range(300)]
+MOVES = 301
+
+def stream(flavor, options, error_rate=0.0, time_scale=0.001, lines=JOB):
+    """Stream lines into a fresh virtual firmware, returns the sender's final event and the firmware's stats"""
+    firmware = simulator.VirtualFirmware(flavor, time_scale=time_scale, error_rate=error_rate, seed=1)
+    firmware.start()
+    try:
+        with serial.Serial(firmware.port, simulator.BAUD_RATE, timeout=1) as port:
+            assert sender.handshake(port, 5)
+            events = queue.Queue()
+            gcode_sender = sender.GcodeSender(port, iter(lines), events, total=len(lines), **options)
+            gcode_sender.start()
+            gcode_sender.join(30)
+            assert not gcode_sender.is_alive()
+    finally:
+        firmware.close()
+    results = [event for event in events.queue if event[0] != "progress"]
+    return results[-1], firmware.stats
+
+@pytest.mark.parametrize("flavor, options", [
+    ("marlin", dict(protocol="window", window=4)),
+    ("grbl", dict(protocol="chars", rx_buffer=127)),
+    ("marlin", dict(protocol="window", window=4, line_numbers=True))
+])
+def test_job_completes(flavor, options):
+    result, stats = stream(flavor, options)
+    assert result == ("done",)
+    assert stats["moves"] == MOVES
+    assert stats["dropped_bytes"] == 0
+
+def test_numbered_lines_resend_errors():
+    result, stats = stream("marlin", dict(protocol="window", window=4, line_numbers=True), error_rate=0.05)
+    assert result == ("done",)
+    assert stats["resends"] > 0
+    assert stats["moves"] == MOVES
+
+@pytest.mark.parametrize("flavor, options", [
+    ("marlin", dict(protocol="window", window=4)),
+    ("grbl", dict(protocol="chars", rx_buffer=127))
+])
+def test_unnumbered_errors_are_reported(flavor, options):
+    result, stats = stream(flavor, options, error_rate=0.05)
+    assert result[0] == "error"
+    assert stats["errors"] > 0
+
+def test_grbl_rejects_m112():
+    result, stats = stream("grbl", dict(protocol="chars", rx_buffer=127), lines=["G4 P0", "M112"])
+    assert result[0] == "error"
+    assert "error:20" in result[1]
+
+@pytest.mark.parametrize("flavor, options", [
+    ("marlin", dict(protocol="window", window=4)),
+    ("grbl", dict(protocol="chars", rx_buffer=127))
+])
+def test_emergency_stop_halts(flavor, options):
+    firmware = simulator.VirtualFirmware(flavor, time_scale=0.05)
+    firmware.start()
+    try:
+        with serial.Serial(firmware.port, simulator.BAUD_RATE, timeout=1) as port:
+            assert sender.handshake(port, 5)
+            events = queue.Queue()
+            gcode_sender = sender.GcodeSender(port, iter(JOB), events, **options)
+            gcode_sender.start()
+            while firmware.stats["moves"] < 10:
+                time.sleep(0.01)
+            gcode_sender.stop(emergency=True)
+            gcode_sender.join(5)
+            deadline = time.perf_counter() + 1
+            while not firmware.halted and time.perf_counter() < deadline:
+                time.sleep(0.01)
+    finally:
+        firmware.close()
+    assert firmware.halted
+    assert firmware.stats["errors"] == 0
+    assert firmware.stats["moves"] < MOVES
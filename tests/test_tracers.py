@@ -0,0 +1,41 @@
+import os
+import sys
+
+import numpy
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import backend
+import motion
+import tracers
+
+
+def twoShapes():
+    """An ellipse and a rectangle, both crossing the seams of 128 px tiles"""
+    img = Image.new("RGB", (512, 384), color=(255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((60, 50, 300, 330), fill=(0, 0, 0))
+    draw.rectangle((320, 100, 470, 260), fill=(0, 0, 0))
+    return img
+
+def planned(curves):
+    """Toolpath stroke count and pen lifts of traced curves"""
+    settings = dict(backend.DEFAULT_SETTINGS)
+    ordered, _ = tracers.minimizeAir(curves)
+    toolpath = backend.planToolpath(ordered, (1600, 1200), settings)
+    _, summary = motion.estimateMotion(backend.generateGcode(toolpath, settings))
+    return len(toolpath[1]), summary["lifts"]
+
+def strokeCount(curves):
+    points = curves.points
+    return 1 + int(numpy.any(points[1:, 0] != points[:-1, 3], axis=1).sum())
+
+
+def test_tiled_trace_stitches_seams():
+    img = twoShapes()
+    untiled = tracers.dropFrame(tracers.traceVTracer(img), img.size)
+    tiled = tracers.dropFrame(tracers.traceTiled(img, tracers.traceVTracer, 128, 32), img.size)
+
+    assert strokeCount(tiled) == strokeCount(untiled)
+    assert planned(tiled) == planned(untiled)
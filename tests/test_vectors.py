@@ -0,0 +1,60 @@
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import vectors
+
+
+def svgFile(tmp_path, body, attributes='viewBox="0 0 100 50"'):
+    path = tmp_path / "art.svg"
+    path.write_text(f'<svg xmlns="http://www.w3.org/2000/svg" {attributes}>{body}</svg>')
+    return str(path)
+
+def ends(image):
+    """Start and end point of every curve"""
+    return numpy.asarray(image.curves.points)[:, [0, 3]]
+
+
+def test_view_box_sets_size_and_origin(tmp_path):
+    image = vectors.loadSvg(svgFile(tmp_path, '<rect x="10" y="20" width="100" height="50"/>', 'viewBox="10 20 100 50" width="200mm"'))
+    assert image.size == (100, 50)
+    assert len(image.curves) == 4
+    numpy.testing.assert_allclose(ends(image)[:, 0], [[0, 0], [100, 0], [100, 50], [0, 50]])
+
+def test_nested_transforms(tmp_path):
+    body = '<g transform="translate(5, 5)"><g transform="scale(2)"><line x1="0" y1="0" x2="10" y2="0" transform="rotate(90)"/></g></g>'
+    image = vectors.loadSvg(svgFile(tmp_path, body))
+    numpy.testing.assert_allclose(ends(image), [[[5, 5], [5, 25]]], atol=1e-9)
+
+def test_shapes_and_skipped_elements(tmp_path):
+    body = (
+        '<defs><rect width="10" height="10"/></defs>'
+        '<circle cx="50" cy="25" r="10"/>'
+        '<polygon points="0,0 10,0 10,10"/>'
+        '<rect width="10" height="10" display="none"/>'
+        '<rect width="0" height="10"/>'
+    )
+    image = vectors.loadSvg(svgFile(tmp_path, body))
+    assert len(image.curves) == 4 + 3
+    circle = numpy.asarray(image.curves.points)[:4]
+    numpy.testing.assert_allclose(numpy.hypot(*(circle[:, [0, 3]] - (50, 25)).T), 10)
+
+def test_path_commands(tmp_path):
+    image = vectors.loadSvg(svgFile(tmp_path, '<path d="M0 0 Q 10 10 20 0 A 5 5 0 0 1 30 0 L 30 10 Z"/>'))
+    assert len(image.curves) == 1 + vectors.SVG_ARC_SEGMENTS + 2
+    quadratic = numpy.asarray(image.curves.points)[0]
+    numpy.testing.assert_allclose(quadratic, [[0, 0], [20 / 3, 20 / 3], [40 / 3, 20 / 3], [20, 0]])
+    numpy.testing.assert_allclose(ends(image)[-1], [[30, 10], [0, 0]])
+
+def test_size_from_artwork_bounds(tmp_path):
+    image = vectors.loadSvg(svgFile(tmp_path, '<line x1="-5" y1="10" x2="15" y2="30"/>', attributes=""))
+    assert image.size == (20, 20)
+    numpy.testing.assert_allclose(ends(image), [[[0, 0], [20, 20]]])
+
+def test_empty_svg_without_size(tmp_path):
+    with pytest.raises(ValueError):
+        vectors.loadSvg(svgFile(tmp_path, "", attributes=""))